@@ -0,0 +1,242 @@
+import hashlib
+import json
+import time
+
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import Prefetch
+from django.utils import timezone
+
+from course_manager.models import Topic, SubTopic, Course, CourseSubjects, Question, CourseEnrollment
+from course_manager.serializers import TopicSerializer, CourseWithSubjectsSerializer, CourseSerializer, \
+    QuestionListSerializer
+from sTest.renderers import ORJSONRenderer
+
+TOPIC_TREE_CACHE_TIMEOUT = 24 * 60 * 60
+CATALOG_VERSION_KEY = 'course_catalog_version'
+# Entries of older catalog versions are never read again and simply expire
+CATALOG_CACHE_TIMEOUT = 24 * 60 * 60
+QUESTION_PAYLOAD_CACHE_TIMEOUT = 24 * 60 * 60
+ENTITLEMENTS_CACHE_TIMEOUT = 24 * 60 * 60
+
+# Question payload variants, students never receive the answer keys
+AUTHOR_VARIANT = 'author'
+STUDENT_VARIANT = 'student'
+
+
+def get_topic_tree_cache_key(course_subject_id):
+    return f'topic_tree_{course_subject_id}'
+
+
+def build_topic_tree(course_subject_id):
+    """
+    Renders the topics of a course subject, with their subtopics, in two queries.
+    """
+    topics = Topic.objects.filter(course_subject_id=course_subject_id).order_by('id').prefetch_related(
+        Prefetch('subtopics', queryset=SubTopic.objects.order_by('id'))
+    )
+    content = ORJSONRenderer().render(TopicSerializer(topics, many=True).data)
+
+    return {
+        'content': content,
+        'etag': f'"{hashlib.md5(content).hexdigest()}"',
+    }
+
+
+def get_topic_tree(course_subject_id):
+    """
+    Returns the pre-rendered topic tree of a course subject along with its ETag.
+    """
+    cache_key = get_topic_tree_cache_key(course_subject_id)
+    topic_tree = cache.get(cache_key)
+    if topic_tree is None:
+        topic_tree = build_topic_tree(course_subject_id)
+        cache.set(cache_key, topic_tree, timeout=TOPIC_TREE_CACHE_TIMEOUT)
+    return topic_tree
+
+
+def get_topic_tree_data(course_subject_id):
+    """
+    Returns the topic tree of a course subject as data, for embedding in other responses.
+    """
+    return json.loads(get_topic_tree(course_subject_id)['content'])
+
+
+def clear_topic_tree(course_subject_id):
+    # Clear after commit as well so that a reader can not cache the tree as it was before the write
+    cache_key = get_topic_tree_cache_key(course_subject_id)
+    cache.delete(cache_key)
+    transaction.on_commit(lambda: cache.delete(cache_key))
+
+
+def get_catalog_version():
+    """
+    Returns the catalog version, the UNIX time of the last course, subject or course subject write.
+    """
+    version = cache.get(CATALOG_VERSION_KEY)
+    if version is None:
+        version = int(time.time())
+        cache.add(CATALOG_VERSION_KEY, version, timeout=None)
+        version = cache.get(CATALOG_VERSION_KEY, version)
+    return version
+
+
+def bump_catalog_version():
+    def bump():
+        # Versions only move forward, even when two writes land within the same second
+        version = max(int(time.time()), cache.get(CATALOG_VERSION_KEY, 0) + 1)
+        cache.set(CATALOG_VERSION_KEY, version, timeout=None)
+
+    bump()
+    transaction.on_commit(bump)
+
+
+def get_catalog_entry(name, build):
+    """
+    Returns the pre-rendered catalog entry `name` for the current catalog version, rendering
+    the data returned by `build` on a miss.
+    """
+    version = get_catalog_version()
+    cache_key = f'course_catalog_{version}_{name}'
+    entry = cache.get(cache_key)
+    if entry is None:
+        content = ORJSONRenderer().render(build())
+        entry = {
+            'content': content,
+            'etag': f'"{version}-{hashlib.md5(content).hexdigest()}"',
+            'last_modified': version,
+        }
+        cache.set(cache_key, entry, timeout=CATALOG_CACHE_TIMEOUT)
+    return entry
+
+
+def prefetch_course_subjects(courses):
+    return courses.prefetch_related(
+        Prefetch('coursesubjects_set', queryset=CourseSubjects.objects.select_related('subject'))
+    )
+
+
+def get_course_catalog():
+    return get_catalog_entry(
+        'courses', lambda: CourseWithSubjectsSerializer(prefetch_course_subjects(Course.get_all()), many=True).data
+    )
+
+
+def get_course_catalog_entry(course_id):
+    return get_catalog_entry(
+        f'course_{course_id}',
+        lambda: CourseWithSubjectsSerializer(prefetch_course_subjects(Course.objects.all()).get(id=course_id)).data
+    )
+
+
+def get_course_names_catalog():
+    return get_catalog_entry('course_names', lambda: CourseSerializer(Course.get_all(), many=True).data)
+
+
+def get_question_payload_key(question_id, variant):
+    return f'question_payload_{variant}_{question_id}'
+
+
+def strip_answer_keys(question_data):
+    student_data = dict(question_data)
+    if question_data['question_type'] == Question.FILL_IN_BLANKS:
+        # The options of a fill in the blanks question are its answers, only the number of blanks is kept
+        student_data['options'] = ['' for _ in question_data['options']]
+    else:
+        student_data['options'] = [{'description': option.get('description')} for option in question_data['options']]
+    return student_data
+
+
+def build_question_payloads(question_ids):
+    """
+    Renders both variants of the given questions in a single query, keyed by cache key.
+    """
+    renderer = ORJSONRenderer()
+    payloads = {}
+    for question in Question.get_questions_for_ids(question_ids).select_related('topic', 'sub_topic'):
+        question_data = QuestionListSerializer(question).data
+        payloads[get_question_payload_key(question.id, AUTHOR_VARIANT)] = renderer.render(question_data)
+        payloads[get_question_payload_key(question.id, STUDENT_VARIANT)] = renderer.render(
+            strip_answer_keys(question_data))
+    return payloads
+
+
+def get_question_payloads(question_ids, variant):
+    """
+    Returns a JSON array of the pre-rendered questions in the order of `question_ids`, skipping unknown ids.
+    Cached payloads are read with one MGET, the missing ones are built in one query and stored with one pipeline.
+    """
+    cache_keys = {question_id: get_question_payload_key(question_id, variant) for question_id in question_ids}
+    payloads = cache.get_many(list(set(cache_keys.values())))
+
+    missing_ids = {question_id for question_id, cache_key in cache_keys.items() if cache_key not in payloads}
+    if missing_ids:
+        built_payloads = build_question_payloads(missing_ids)
+        cache.set_many(built_payloads, timeout=QUESTION_PAYLOAD_CACHE_TIMEOUT)
+        payloads.update(built_payloads)
+
+    return b'[' + b','.join(
+        payloads[cache_keys[question_id]] for question_id in question_ids if cache_keys[question_id] in payloads
+    ) + b']'
+
+
+def clear_question_payloads(question_ids):
+    cache_keys = [get_question_payload_key(question_id, variant)
+                  for question_id in question_ids for variant in (AUTHOR_VARIANT, STUDENT_VARIANT)]
+    cache.delete_many(cache_keys)
+    transaction.on_commit(lambda: cache.delete_many(cache_keys))
+
+
+def get_entitlements_key(user_id):
+    # Keyed by the catalog version, so that new course subjects show up in the map
+    return f'entitlements_{get_catalog_version()}_{user_id}'
+
+
+def build_entitlements(user_id):
+    """
+    Maps the enrolled courses of a student to their subscription, and the course subjects of those courses
+    to their course, in one query.
+    """
+    entitlements = {'courses': {}, 'course_subjects': {}}
+    enrollments = CourseEnrollment.objects.filter(student_id=user_id).values(
+        'course_id', 'subscription_type', 'subscription_start_date', 'subscription_end_date',
+        'course__coursesubjects__id')
+    for enrollment in enrollments:
+        entitlements['courses'][enrollment['course_id']] = {
+            'subscription_type': enrollment['subscription_type'],
+            'subscription_start_date': enrollment['subscription_start_date'],
+            'subscription_end_date': enrollment['subscription_end_date'],
+        }
+        if enrollment['course__coursesubjects__id'] is not None:
+            entitlements['course_subjects'][enrollment['course__coursesubjects__id']] = enrollment['course_id']
+    return entitlements
+
+
+def get_entitlements(user_id):
+    cache_key = get_entitlements_key(user_id)
+    entitlements = cache.get(cache_key)
+    if entitlements is None:
+        entitlements = build_entitlements(user_id)
+        cache.set(cache_key, entitlements, timeout=ENTITLEMENTS_CACHE_TIMEOUT)
+    return entitlements
+
+
+def get_course_subject_entitlement(user_id, course_subject_id):
+    entitlements = get_entitlements(user_id)
+    try:
+        course_id = entitlements['course_subjects'].get(int(course_subject_id))
+    except (TypeError, ValueError):
+        return None
+    return entitlements['courses'].get(course_id)
+
+
+def has_paid_access(entitlement):
+    # A paid subscription that ended is treated as free even before the nightly downgrade has run
+    return entitlement['subscription_type'] == CourseEnrollment.PAID and (
+        entitlement['subscription_end_date'] is None or entitlement['subscription_end_date'] >= timezone.localdate())
+
+
+def clear_entitlements(user_id):
+    cache_key = get_entitlements_key(user_id)
+    cache.delete(cache_key)
+    transaction.on_commit(lambda: cache.delete(cache_key))
@@ -12,7 +12,8 @@ class CharListFilter(filters.BaseInFilter, filters.CharFilter):
 
 
 class QuestionFilter(filters.FilterSet):
-    description = filters.CharFilter(lookup_expr='icontains')
+    # Matches the HTML-stripped text, backed by a trigram index, instead of the raw markup
+    description = filters.CharFilter(field_name='search_document', lookup_expr='icontains')
     topic = IntegerListFilter(field_name='topic__id')
     sub_topic = IntegerListFilter(field_name='sub_topic__id')
     test_type = CharListFilter()
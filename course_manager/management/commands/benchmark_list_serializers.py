@@ -0,0 +1,58 @@
+import json
+import time
+
+from django.core.management.base import BaseCommand
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+
+from course_manager.models import Question, Material
+from course_manager.serializers import QuestionListSerializer, QuestionListValuesSerializer, \
+    MaterialListSerializer, MaterialListValuesSerializer
+from test_manager.models import Test
+from test_manager.serializers import TestListSerializer, TestListValuesSerializer
+
+
+class Command(BaseCommand):
+    help = "Compare the DRF list serializers with their values() based counterparts"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--page-size', type=int, default=15)
+        parser.add_argument('--iterations', type=int, default=20)
+
+    def handle(self, *args, **options):
+        page_size = options['page_size']
+        iterations = options['iterations']
+
+        cases = [
+            ('questions', Question.objects.select_related('topic', 'sub_topic').order_by('-id'),
+             QuestionListSerializer, QuestionListValuesSerializer),
+            ('materials', Material.objects.select_related('created_by', 'topic', 'sub_topic').order_by('id'),
+             MaterialListSerializer, MaterialListValuesSerializer),
+            ('tests', Test.objects.select_related('course').order_by('-id'),
+             TestListSerializer, TestListValuesSerializer),
+        ]
+
+        for name, queryset, drf_serializer_class, values_serializer_class in cases:
+            def serialize_with_drf():
+                return drf_serializer_class(list(queryset[:page_size]), many=True).data
+
+            def serialize_with_values():
+                values_serializer = values_serializer_class()
+                return values_serializer.to_representation(list(values_serializer.get_queryset(queryset)[:page_size]))
+
+            for label, serialize in (('drf', serialize_with_drf), ('values', serialize_with_values)):
+                elapsed, queries, size = self.measure(serialize, iterations)
+                self.stdout.write(f'{name:<10} {label:<7} {elapsed:8.2f} ms  {queries:3d} queries  {size:8d} bytes')
+
+    @staticmethod
+    def measure(serialize, iterations):
+        with CaptureQueriesContext(connection) as context:
+            payload = serialize()
+
+        start = time.perf_counter()
+        for _ in range(iterations):
+            serialize()
+        elapsed = (time.perf_counter() - start) * 1000 / iterations
+
+        return elapsed, len(context.captured_queries), len(json.dumps(payload, cls=DjangoJSONEncoder))
@@ -0,0 +1,21 @@
+from django.core.management.base import BaseCommand
+
+from course_manager.models import Question
+from course_manager.search import update_question_search_index
+
+
+class Command(BaseCommand):
+    help = "Build the search document and vector for every question"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--chunk-size', type=int, default=500)
+
+    def handle(self, *args, **options):
+        questions = Question.objects.only('id', 'description', 'reading_comprehension_passage', 'options')
+
+        indexed = 0
+        for question in questions.iterator(chunk_size=options['chunk_size']):
+            update_question_search_index(question)
+            indexed += 1
+
+        self.stdout.write(self.style.SUCCESS(f'Indexed {indexed} questions.'))
@@ -0,0 +1,39 @@
+# Generated by Django 4.1.10 on 2026-10-19 11:02
+
+import django.contrib.postgres.indexes
+import django.contrib.postgres.search
+from django.contrib.postgres.operations import TrigramExtension
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("course_manager", "0032_alter_combinedscore_subject_name"),
+    ]
+
+    operations = [
+        TrigramExtension(),
+        migrations.AddField(
+            model_name="question",
+            name="search_document",
+            field=models.TextField(blank=True, default=""),
+        ),
+        migrations.AddField(
+            model_name="question",
+            name="search_vector",
+            field=django.contrib.postgres.search.SearchVectorField(blank=True, null=True),
+        ),
+        migrations.AddIndex(
+            model_name="question",
+            index=django.contrib.postgres.indexes.GinIndex(
+                fields=["search_vector"], name="question_search_vector_idx"
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="question",
+            index=django.contrib.postgres.indexes.GinIndex(
+                fields=["search_document"], name="question_search_doc_trgm_idx", opclasses=["gin_trgm_ops"]
+            ),
+        ),
+    ]
@@ -1,3 +1,5 @@
+from django.contrib.postgres.indexes import GinIndex
+from django.contrib.postgres.search import SearchVectorField
 from django.db import models
 
 from user_manager.models import User
@@ -186,8 +188,16 @@ class Question(models.Model):
     ]
     test_type = models.CharField(max_length=20, choices=TEST_TYPE_CHOICES, default=FULL_LENGTH_TEST_TYPE)
 
+    # HTML-stripped text of the description, passage and options, maintained by course_manager.search
+    search_document = models.TextField(blank=True, default='')
+    search_vector = SearchVectorField(null=True, blank=True)
+
     class Meta:
         ordering = ['-created_at']
+        indexes = [
+            GinIndex(fields=['search_vector'], name='question_search_vector_idx'),
+            GinIndex(fields=['search_document'], opclasses=['gin_trgm_ops'], name='question_search_doc_trgm_idx'),
+        ]
 
     @classmethod
     def get_questions_for_subject(cls, course_subject_id):
@@ -0,0 +1,53 @@
+from bs4 import BeautifulSoup
+from django.contrib.postgres.search import SearchQuery, SearchRank, SearchVector, TrigramWordSimilarity
+from django.db.models import F, Q, Value
+
+from .models import Question
+
+SEARCH_CONFIG = 'english'
+
+
+def strip_html(html_string):
+    """
+    Returns the visible text of Quill/MathML markup with whitespace collapsed.
+    """
+    if not html_string:
+        return ''
+    return ' '.join(BeautifulSoup(html_string, 'html.parser').get_text(' ').split())
+
+
+def get_options_text(options):
+    if not isinstance(options, list):
+        return ''
+    # Fill in the blanks answers are plain strings, other question types are dicts with a description
+    return ' '.join(strip_html(option if isinstance(option, str) else option.get('description'))
+                    for option in options)
+
+
+def update_question_search_index(question):
+    description = strip_html(question.description)
+    passage = strip_html(question.reading_comprehension_passage)
+    options = get_options_text(question.options)
+
+    search_vector = SearchVector(Value(description), weight='A', config=SEARCH_CONFIG) + \
+        SearchVector(Value(passage), weight='B', config=SEARCH_CONFIG) + \
+        SearchVector(Value(options), weight='C', config=SEARCH_CONFIG)
+
+    # update() does not send post_save, so this does not re-trigger the index signal
+    Question.objects.filter(pk=question.pk).update(
+        search_document=' '.join(text for text in [description, passage, options] if text),
+        search_vector=search_vector
+    )
+
+
+def search_questions(queryset, query):
+    """
+    Matches questions on the full-text vector, falling back to trigram word similarity on the
+    plain text document for typos and partial words, ranked by both.
+    """
+    search_query = SearchQuery(query, search_type='websearch', config=SEARCH_CONFIG)
+    return queryset.filter(
+        Q(search_vector=search_query) | Q(search_document__trigram_word_similar=query)
+    ).annotate(
+        rank=SearchRank(F('search_vector'), search_query) + TrigramWordSimilarity(query, 'search_document')
+    ).order_by('-rank', '-id')
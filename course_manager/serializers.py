@@ -1,6 +1,7 @@
 from rest_framework import serializers
 
 from sTest.aws_client import AwsStorageClient
+from sTest.serializers import ValuesListSerializer
 from .models import Course, Question, CourseSubjects, CourseEnrollment, Subject, Material, SubTopic, Topic
 
 
@@ -156,6 +157,27 @@ class QuestionListSerializer(serializers.ModelSerializer):
                   'topic', 'sub_topic', 'difficulty', 'test_type', 'is_active', 'show_calculator']
 
 
+class QuestionListValuesSerializer(ValuesListSerializer):
+    """
+    Same output as QuestionListSerializer, built from a single values() query.
+    """
+    fields = {
+        'id': 'id',
+        'description': 'description',
+        'course_subject': 'course_subject_id',
+        'reading_comprehension_passage': 'reading_comprehension_passage',
+        'question_type': 'question_type',
+        'options': 'options',
+        'has_suggestion': 'has_suggestion',
+        'topic': 'topic__name',
+        'sub_topic': 'sub_topic__name',
+        'difficulty': 'difficulty',
+        'test_type': 'test_type',
+        'is_active': 'is_active',
+        'show_calculator': 'show_calculator',
+    }
+
+
 class CourseEnrollmentSerializer(serializers.ModelSerializer):
     course = CourseWithSubjectsSerializerForUserDetails()
 
@@ -229,6 +251,25 @@ class MaterialListSerializer(serializers.ModelSerializer):
         return obj.created_by.name
 
 
+class MaterialListValuesSerializer(ValuesListSerializer):
+    """
+    Same output as MaterialListSerializer, built from a single values() query.
+    """
+    fields = {
+        'id': 'id',
+        'course_subject': 'course_subject_id',
+        'name': 'name',
+        'material_type': 'material_type',
+        'access_type': 'access_type',
+        'file_name': 'file_name',
+        'uploaded_at': 'uploaded_at',
+        'created_by': 'created_by__name',
+        'topic': 'topic__name',
+        'sub_topic': 'sub_topic__name',
+    }
+    datetime_fields = ('uploaded_at',)
+
+
 class MaterialDetailsSerializer(serializers.ModelSerializer):
     material_url = serializers.SerializerMethodField()
     created_by = serializers.SerializerMethodField()
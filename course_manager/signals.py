@@ -0,0 +1,54 @@
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
+
+from .cache import clear_topic_tree, bump_catalog_version, clear_question_payloads, clear_entitlements
+from .models import Question, Topic, SubTopic, Course, Subject, CourseSubjects, CourseEnrollment
+from .search import update_question_search_index
+
+
+@receiver(post_save, sender=Question)
+def index_question_for_search(sender, instance, **kwargs):
+    update_question_search_index(instance)
+
+
+@receiver([post_save, post_delete], sender=Question)
+def clear_question_payloads_for_question(sender, instance, **kwargs):
+    clear_question_payloads([instance.id])
+
+
+@receiver(post_save, sender=Topic)
+def clear_question_payloads_for_topic(sender, instance, created, **kwargs):
+    # Question payloads embed the topic name, a new topic has no questions yet
+    if not created:
+        clear_question_payloads(Question.objects.filter(topic=instance).values_list('id', flat=True))
+
+
+@receiver(post_save, sender=SubTopic)
+def clear_question_payloads_for_sub_topic(sender, instance, created, **kwargs):
+    if not created:
+        clear_question_payloads(Question.objects.filter(sub_topic=instance).values_list('id', flat=True))
+
+
+@receiver([post_save, post_delete], sender=Topic)
+def clear_topic_tree_for_topic(sender, instance, **kwargs):
+    clear_topic_tree(instance.course_subject_id)
+
+
+@receiver([post_save, post_delete], sender=SubTopic)
+def clear_topic_tree_for_sub_topic(sender, instance, **kwargs):
+    course_subject_id = Topic.objects.filter(id=instance.topic_id).values_list('course_subject_id', flat=True).first()
+    # When the topic itself is being deleted its own signal clears the tree
+    if course_subject_id is not None:
+        clear_topic_tree(course_subject_id)
+
+
+@receiver([post_save, post_delete], sender=Course)
+@receiver([post_save, post_delete], sender=Subject)
+@receiver([post_save, post_delete], sender=CourseSubjects)
+def clear_course_catalog(sender, instance, **kwargs):
+    bump_catalog_version()
+
+
+@receiver([post_save, post_delete], sender=CourseEnrollment)
+def clear_entitlements_for_enrollment(sender, instance, **kwargs):
+    clear_entitlements(instance.student_id)
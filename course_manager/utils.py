@@ -1,3 +1,10 @@
+import time
+
+from sTest.aws_client import get_presigned_url_expiry
+from .cache import get_topic_tree
+from .models import Question, Material
+
+
 def validate_add_question_request(request):
     data = request.data
 
@@ -5,3 +12,24 @@ def validate_add_question_request(request):
     for required_field in required_fields:
         if data.get(required_field) is None:
             raise Exception(f'{required_field} is mandatory')
+
+
+def get_question_validators(view, request, pk=None, *args, **kwargs):
+    question = Question.objects.filter(id=pk).values('updated_at', 'course_subject_id').first()
+    if question is None:
+        return None, None
+
+    # The question is returned with the topic tree of its subject
+    topic_tree_etag = get_topic_tree(question['course_subject_id'])['etag'].strip('"')
+    return f"{pk}-{question['updated_at'].timestamp()}-{topic_tree_etag}", None
+
+
+def get_material_validators(view, request, pk=None, *args, **kwargs):
+    material = Material.objects.filter(id=pk).values('updated_at', 'course_subject_id').first()
+    if material is None:
+        return None, None
+
+    topic_tree_etag = get_topic_tree(material['course_subject_id'])['etag'].strip('"')
+    # Change the ETag every half expiry so that a revalidated material never holds an expired presigned url
+    url_window = int(time.time()) // max(get_presigned_url_expiry() // 2, 1)
+    return f"{pk}-{material['updated_at'].timestamp()}-{topic_tree_etag}-{url_window}", None
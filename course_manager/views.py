@@ -6,6 +6,7 @@ from django.core.exceptions import ValidationError
 from django.core.files.storage import FileSystemStorage
 from django.db import transaction
 from django.db.models import Q
+from django.http import HttpResponse
 from django.utils import timezone
 from django_filters.rest_framework import DjangoFilterBackend
 from rest_framework import status, viewsets
@@ -14,15 +15,23 @@ from rest_framework.permissions import AllowAny
 from rest_framework.response import Response
 
 from sTest.aws_client import AwsStorageClient
+from sTest.conditional import get_rendered_response, conditional_response
 from sTest.permissions import IsAdminOrContentDeveloperOrFaculty, IsAdminOrContentDeveloper, IsAdmin, \
     IsAdminOrContentDeveloperOrFacultyOrStudent
-from sTest.utils import get_error_response_for_serializer, get_error_response, CustomPageNumberPagination
+from sTest.utils import get_error_response_for_serializer, get_error_response, CustomPageNumberPagination, \
+    get_paginator
 from user_manager.serializers import StudentSerializer
+from .cache import get_topic_tree, get_topic_tree_data, get_course_catalog, get_course_catalog_entry, \
+    get_course_names_catalog, get_question_payloads, AUTHOR_VARIANT, STUDENT_VARIANT, get_course_subject_entitlement, \
+    has_paid_access
 from .filters import QuestionFilter, MaterialFilter
-from .models import Question, Course, Subject, CourseSubjects, Material, CourseEnrollment, Topic
-from .serializers import CreateQuestionSerializer, CourseWithSubjectsSerializer, QuestionListSerializer, \
+from .models import Question, Course, Subject, CourseSubjects, Material
+from .search import search_questions
+from .serializers import CreateQuestionSerializer, QuestionListSerializer, \
     CourseSerializer, CreateCourseSerializer, MaterialSerializer, SubjectSerializer, \
-    MaterialListSerializer, MaterialDetailsSerializer, TopicSerializer
+    MaterialDetailsSerializer, QuestionListValuesSerializer, \
+    MaterialListValuesSerializer
+from .utils import get_question_validators, get_material_validators
 
 
 class CourseViewSet(viewsets.ModelViewSet):
@@ -68,15 +77,13 @@ class CourseViewSet(viewsets.ModelViewSet):
 
     @permission_classes([IsAdminOrContentDeveloperOrFaculty])
     def list(self, request, *args, **kwargs):
-        courses = Course.get_all()
-        serializer = CourseWithSubjectsSerializer(courses, many=True)
-        return Response(serializer.data, status=status.HTTP_200_OK)
+        catalog = get_course_catalog()
+        return get_rendered_response(request, catalog['content'], catalog['etag'], catalog['last_modified'])
 
     @permission_classes([IsAdmin])
     def retrieve(self, request, pk=None, *args, **kwargs):
-        course = Course.get_course_by_id(course_id=pk)
-        serializer = CourseWithSubjectsSerializer(course)
-        return Response(serializer.data, status=status.HTTP_200_OK)
+        catalog = get_course_catalog_entry(course_id=pk)
+        return get_rendered_response(request, catalog['content'], catalog['etag'], catalog['last_modified'])
 
     @permission_classes([IsAdmin])
     @transaction.atomic
@@ -161,9 +168,10 @@ class CourseViewSet(viewsets.ModelViewSet):
 
     @action(detail=False, methods=['GET'], permission_classes=[AllowAny], url_path='list')
     def list_courses(self, request):
-        courses = Course.get_all()
-        serializer = CourseSerializer(courses, many=True)
-        return Response(serializer.data, status=status.HTTP_200_OK)
+        catalog = get_course_names_catalog()
+        # Public and identical for every visitor, so shared caches may keep it for a minute
+        return get_rendered_response(request, catalog['content'], catalog['etag'], catalog['last_modified'],
+                                     cache_control='public, max-age=60')
 
     @action(detail=False, methods=['GET'], permission_classes=[IsAdminOrContentDeveloperOrFaculty],
             url_path='(?P<course_subject_id>\d+)/questions')
@@ -173,8 +181,6 @@ class CourseViewSet(viewsets.ModelViewSet):
             return get_error_response('Subject is mandatory')
 
         questions = Question.get_questions_for_subject(course_subject_id=course_subject_id)
-        topics = Topic.objects.filter(course_subject_id=course_subject_id)
-
         # Apply dynamic filtering
         filter_backends = [DjangoFilterBackend]
         filterset = QuestionFilter(request.GET, queryset=questions)
@@ -184,17 +190,15 @@ class CourseViewSet(viewsets.ModelViewSet):
         filtered_questions = filterset.qs
 
         # Apply pagination
-        paginator = CustomPageNumberPagination()
-        paginator.page_size = 15
-        paginated_questions = paginator.paginate_queryset(filtered_questions, request)
-
-        questions_serializer = QuestionListSerializer(paginated_questions, many=True)
-        topics_serializer = TopicSerializer(topics, many=True)
+        questions_serializer = QuestionListValuesSerializer(request)
+        paginator = get_paginator(request, ordering='-id')
+        paginated_questions = paginator.paginate_queryset(questions_serializer.get_queryset(filtered_questions),
+                                                          request)
 
         # Return the paginated response with topics
         return paginator.get_paginated_response({
-            'questions': questions_serializer.data,
-            'topics': topics_serializer.data
+            'questions': questions_serializer.to_representation(paginated_questions),
+            'topics': get_topic_tree_data(course_subject_id)
         })
 
     @action(detail=False, methods=['GET'], permission_classes=[IsAdminOrContentDeveloperOrFacultyOrStudent],
@@ -204,11 +208,9 @@ class CourseViewSet(viewsets.ModelViewSet):
             self.logger.exception('Error processing the request because no course subject id was provided')
             return get_error_response('Subject is mandatory')
 
-        topics = Topic.objects.filter(course_subject_id=course_subject_id)
-
-        topics_serializer = TopicSerializer(topics, many=True)
+        topic_tree = get_topic_tree(course_subject_id)
 
-        return Response(data=topics_serializer.data, status=status.HTTP_200_OK)
+        return get_rendered_response(request, topic_tree['content'], topic_tree['etag'])
 
     @action(detail=True, methods=['GET'], url_path='students')
     def list_students_for_course(self, request, pk=None, *args, **kwargs):
@@ -355,12 +357,40 @@ class QuestionViewSet(viewsets.ModelViewSet):
         serializer.save(updated_by=self.request.user, updated_at=timezone.now())
 
     @permission_classes([IsAdminOrContentDeveloperOrFaculty])
+    @conditional_response(get_question_validators)
     def retrieve(self, request, pk=None, *args, **kwargs):
         instance = Question.get_question_by_id(question_id=pk)
         serializer = QuestionListSerializer(instance=instance)
-        topics = Topic.objects.filter(course_subject_id=instance.course_subject)
-        topics_serializer = TopicSerializer(topics, many=True)
-        return Response({'detail': serializer.data, 'topics': topics_serializer.data}, status=status.HTTP_200_OK)
+        topics = get_topic_tree_data(instance.course_subject_id)
+        return Response({'detail': serializer.data, 'topics': topics}, status=status.HTTP_200_OK)
+
+    @action(detail=False, methods=['GET'], permission_classes=[IsAdminOrContentDeveloperOrFaculty], url_path='search')
+    def search_question_bank(self, request):
+        query = request.query_params.get('q', '').strip()
+        if not query:
+            return get_error_response('Search text is mandatory')
+
+        questions = Question.objects.select_related('topic', 'sub_topic')
+
+        course_subject_filter = request.query_params.get('course_subject_id', None)
+        if course_subject_filter is not None:
+            questions = questions.filter(course_subject_id=course_subject_filter)
+
+        # Apply dynamic filtering (topic, sub_topic, difficulty, test_type, is_active)
+        filterset = QuestionFilter(request.GET, queryset=questions)
+        if not filterset.is_valid():
+            return get_error_response('Invalid filter parameters')
+
+        ranked_questions = search_questions(filterset.qs, query)
+
+        # Apply pagination, results stay in rank order so keyset pagination is not offered here
+        paginator = CustomPageNumberPagination()
+        paginator.page_size = 15
+        paginated_questions = paginator.paginate_queryset(ranked_questions, request)
+
+        serializer = QuestionListSerializer(paginated_questions, many=True)
+
+        return paginator.get_paginated_response(serializer.data)
 
     @permission_classes([IsAdminOrContentDeveloper])
     def destroy(self, request, pk=None, *args, **kwargs):
@@ -406,15 +436,10 @@ class QuestionViewSet(viewsets.ModelViewSet):
         if not question_ids:
             return Response({"error": "No question IDs provided."}, status=status.HTTP_400_BAD_REQUEST)
 
-        questions = Question.get_questions_for_ids(question_ids)
-
-        # Create a dictionary to reorder questions as per the IDs provided
-        question_dict = {question.id: question for question in questions}
-        ordered_questions = [question_dict[question_id] for question_id in question_ids if
-                             question_id in question_dict]
-
-        serializer = QuestionListSerializer(ordered_questions, many=True)
-        return Response(serializer.data, status=status.HTTP_200_OK)
+        # Students get the variant without the answer keys, both keep the order of the IDs provided
+        variant = STUDENT_VARIANT if request.user.role.name == 'student' else AUTHOR_VARIANT
+        content = get_question_payloads(question_ids, variant)
+        return HttpResponse(content, content_type='application/json')
 
 
 class MaterialViewSet(viewsets.ModelViewSet):
@@ -464,13 +489,13 @@ class MaterialViewSet(viewsets.ModelViewSet):
         course_subject_filter = self.request.query_params.get('course_subject_id', None)
 
         if user.role.name == 'student':
-            course_subject = CourseSubjects.get_course_subject_by_id(course_subject_filter)
-            course_enrollment = CourseEnrollment.get_student_enrollment_using_student_course(student_id=user.id,
-                                                                                             course_id=course_subject.course_id)
-            if course_enrollment.subscription_type == CourseEnrollment.FREE:
-                qs = self.queryset.filter(access_type=Material.FREE_ACCESS_TYPE)
-            else:
+            entitlement = get_course_subject_entitlement(user.id, course_subject_filter)
+            if entitlement is None:
+                return get_error_response('You are not enrolled in this course.')
+            if has_paid_access(entitlement):
                 qs = self.queryset.all()
+            else:
+                qs = self.queryset.filter(access_type=Material.FREE_ACCESS_TYPE)
         else:
             qs = self.queryset.all()
 
@@ -486,16 +511,15 @@ class MaterialViewSet(viewsets.ModelViewSet):
         materials = filterset.qs
 
         # Apply pagination
-        paginator = CustomPageNumberPagination()
-        paginator.page_size = 15
-        paginated_materials = paginator.paginate_queryset(materials, request)
-
-        serializer = MaterialListSerializer(paginated_materials, many=True)
+        serializer = MaterialListValuesSerializer(request)
+        paginator = get_paginator(request, ordering='id')
+        paginated_materials = paginator.paginate_queryset(serializer.get_queryset(materials), request)
 
         # Return the paginated response
-        return paginator.get_paginated_response(serializer.data)
+        return paginator.get_paginated_response(serializer.to_representation(paginated_materials))
 
     @permission_classes([IsAdminOrContentDeveloperOrFacultyOrStudent])
+    @conditional_response(get_material_validators)
     def retrieve(self, request, pk=None, *args, **kwargs):
         material = Material.get_material_by_id(material_id=pk)
         serializer = MaterialDetailsSerializer(material)
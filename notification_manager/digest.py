@@ -0,0 +1,102 @@
+import json
+import time
+
+from django.conf import settings
+from django_redis import get_redis_connection
+
+from notification_manager.models import NotificationTemplate, Notification
+from notification_manager.read_state import add_unread_notification, record_digest_references
+from notification_manager.utils import send_notification
+
+NOTIFICATION_DIGEST_DUE_KEY = 'notification_digest_due'
+
+# Sent right away, the user is waiting for them
+URGENT_NOTIFICATIONS = {
+    Notification.REGISTRATION_OTP_NOTIFICATION,
+    Notification.FORGOT_PASSWORD_NOTIFICATION,
+    Notification.REGISTRATION_NOTIFICATION,
+}
+# Params where a digest keeps the value of the latest notification instead of listing them all,
+# the references of the other notifications are recorded by record_digest_references
+LATEST_VALUE_PARAMS = {
+    NotificationTemplate.REFERENCE_ID,
+    NotificationTemplate.RESET_LINK,
+    NotificationTemplate.USER_NAME,
+}
+
+
+def get_notification_digest_key(user_id, notification_name):
+    return f'notification_digest_{user_id}_{notification_name}'
+
+
+def queue_notification(notification_name, params, user_id):
+    """
+    Buffers a notification for the digest of the user and notification type, the digest is sent once
+    settings.NOTIFICATION_DIGEST_WINDOW seconds have passed since its first notification.
+    Urgent notifications are sent immediately.
+    """
+    if notification_name in URGENT_NOTIFICATIONS:
+        add_unread_notification(notification_name=notification_name, user_id=user_id)
+        send_notification.delay(notification_name=notification_name, params=params, user_id=user_id)
+        return
+
+    redis = get_redis_connection('default')
+    pipeline = redis.pipeline()
+    pipeline.rpush(get_notification_digest_key(user_id, notification_name), json.dumps(params))
+    # NX keeps the deadline of the first buffered notification
+    pipeline.zadd(NOTIFICATION_DIGEST_DUE_KEY, {f'{user_id}:{notification_name}': time.time() +
+                                                settings.NOTIFICATION_DIGEST_WINDOW}, nx=True)
+    pipeline.execute()
+
+
+def merge_notification_params(params_list):
+    """
+    Combines the params of several notifications of the same type, differing values are listed
+    in order, e.g. the names of all the tests assigned within the window.
+    """
+    merged = {}
+    for key in params_list[-1]:
+        values = [params[key] for params in params_list if key in params]
+        if key in LATEST_VALUE_PARAMS:
+            merged[key] = values[-1]
+        else:
+            distinct_values = list(dict.fromkeys(str(value) for value in values))
+            merged[key] = ', '.join(distinct_values)
+    return merged
+
+
+def send_due_digests(limit=500):
+    """
+    Sends every digest whose window has passed, one notification per user and type.
+    Returns the number of digests sent.
+    """
+    redis = get_redis_connection('default')
+    due_members = redis.zrangebyscore(NOTIFICATION_DIGEST_DUE_KEY, 0, time.time(), start=0, num=limit)
+
+    sent = 0
+    for member in due_members:
+        # Only the flusher that removes the entry sends the digest
+        if not redis.zrem(NOTIFICATION_DIGEST_DUE_KEY, member):
+            continue
+
+        user_id, notification_name = member.decode().split(':', 1)
+        digest_key = get_notification_digest_key(user_id, notification_name)
+
+        pipeline = redis.pipeline(transaction=True)
+        pipeline.lrange(digest_key, 0, -1)
+        pipeline.delete(digest_key)
+        buffered, _ = pipeline.execute()
+        if not buffered:
+            continue
+
+        params_list = [json.loads(params) for params in buffered]
+        params = params_list[0] if len(params_list) == 1 else merge_notification_params(params_list)
+        reference_ids = [member_params[NotificationTemplate.REFERENCE_ID] for member_params in params_list
+                         if NotificationTemplate.REFERENCE_ID in member_params]
+        if len(reference_ids) > 1:
+            record_digest_references(notification_name=notification_name, user_id=int(user_id),
+                                     reference_ids=reference_ids)
+        add_unread_notification(notification_name=notification_name, user_id=int(user_id))
+        send_notification(notification_name=notification_name, params=params, user_id=int(user_id))
+        sent += 1
+    return sent
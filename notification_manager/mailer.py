@@ -0,0 +1,264 @@
+import hashlib
+import json
+import logging
+import smtplib
+import time
+
+from django.conf import settings
+from django.core.mail import EmailMultiAlternatives, get_connection
+from django.core.mail.backends.base import BaseEmailBackend
+from django.template import Context, Engine
+from django_redis import get_redis_connection
+
+logger = logging.getLogger('Notification')
+
+EMAIL_TEMPLATES_KEY = 'email_templates'
+EMAIL_BATCH_TEMPLATES_KEY = 'email_batch_templates'
+EMAIL_RETRY_KEY = 'email_retry'
+
+# Compiled subject and body templates of this worker, keyed by template name
+_compiled_templates = {}
+# Open SMTP connections of this worker, keyed by connection settings
+_connection_pools = {}
+
+# Pass-through templates of the emails that the QueuedEmailBackend receives already rendered,
+# the context is not escaped for plain text
+RENDERED_TEMPLATE_NAME = 'rendered'
+RENDERED_HTML_TEMPLATE_NAME = 'rendered_html'
+RENDERED_SUBJECT = '{{ subject }}'
+RENDERED_BODY = '{{ body }}'
+RENDERED_HTML_BODY = '{{ body|safe }}'
+
+
+def get_email_batch_key(template_name):
+    return f'email_batch_{template_name}'
+
+
+def queue_email(template_name, subject_template, body_template, recipient, context, html=False, from_email=None):
+    """
+    Queues an email into the batch of its template. The template source is stored once per template,
+    each queued email only carries its recipient and context.
+    """
+    redis = get_redis_connection('default')
+    template = json.dumps({'subject': subject_template, 'body': body_template, 'html': html})
+    message = json.dumps({'to': recipient, 'from': from_email, 'context': context, 'attempts': 0})
+
+    pipeline = redis.pipeline()
+    pipeline.hset(EMAIL_TEMPLATES_KEY, template_name, template)
+    pipeline.rpush(get_email_batch_key(template_name), message)
+    pipeline.sadd(EMAIL_BATCH_TEMPLATES_KEY, template_name)
+    pipeline.execute()
+
+
+def get_compiled_template(template_name, template_source):
+    source_hash = hashlib.md5(template_source).hexdigest()
+    compiled = _compiled_templates.get(template_name)
+    if compiled is None or compiled['hash'] != source_hash:
+        template = json.loads(template_source)
+        engine = Engine.get_default()
+        compiled = {
+            'hash': source_hash,
+            'subject': engine.from_string(template['subject']),
+            'body': engine.from_string(template['body']),
+            'html': template['html'],
+        }
+        _compiled_templates[template_name] = compiled
+    return compiled
+
+
+class TokenBucket:
+    """
+    Allows `rate` sends per second on average with bursts of up to `capacity`.
+    """
+
+    def __init__(self, rate, capacity):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated_at = time.monotonic()
+
+    def consume(self):
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated_at) * self.rate)
+        self.updated_at = now
+        if self.tokens < 1:
+            time.sleep((1 - self.tokens) / self.rate)
+            self.tokens = 1
+            self.updated_at = time.monotonic()
+        self.tokens -= 1
+
+
+class SMTPConnectionPool:
+    """
+    Keeps up to `size` SMTP connections open between batches instead of connecting per email.
+    """
+
+    def __init__(self, size, **connection_kwargs):
+        self.size = size
+        self.connection_kwargs = connection_kwargs
+        self.idle_connections = []
+
+    def acquire(self):
+        if self.idle_connections:
+            return self.idle_connections.pop()
+        connection = get_connection(backend=settings.EMAIL_DELIVERY_BACKEND, fail_silently=False,
+                                    **self.connection_kwargs)
+        connection.open()
+        return connection
+
+    def release(self, connection):
+        if len(self.idle_connections) < self.size:
+            self.idle_connections.append(connection)
+        else:
+            connection.close()
+
+    @staticmethod
+    def discard(connection):
+        try:
+            connection.close()
+        except Exception:
+            pass
+
+
+def get_connection_pool(**connection_kwargs):
+    pool_key = tuple(sorted(connection_kwargs.items()))
+    if pool_key not in _connection_pools:
+        _connection_pools[pool_key] = SMTPConnectionPool(settings.EMAIL_POOL_SIZE, **connection_kwargs)
+    return _connection_pools[pool_key]
+
+
+def schedule_retry(redis, template_name, message):
+    message['attempts'] += 1
+    if message['attempts'] >= settings.EMAIL_MAX_ATTEMPTS:
+        logger.error(f'Giving up on {template_name} email to {message["to"]} after {message["attempts"]} attempts')
+        return
+
+    # Exponential backoff, capped at an hour
+    retry_at = time.time() + min(settings.EMAIL_RETRY_BACKOFF * 2 ** (message['attempts'] - 1), 3600)
+    redis.zadd(EMAIL_RETRY_KEY, {json.dumps({'template': template_name, 'message': message}): retry_at})
+
+
+def requeue_due_retries(redis):
+    due_retries = redis.zrangebyscore(EMAIL_RETRY_KEY, 0, time.time())
+    for retry in due_retries:
+        # Only the worker that removes the entry requeues it
+        if redis.zrem(EMAIL_RETRY_KEY, retry):
+            retry = json.loads(retry)
+            redis.rpush(get_email_batch_key(retry['template']), json.dumps(retry['message']))
+            redis.sadd(EMAIL_BATCH_TEMPLATES_KEY, retry['template'])
+
+
+def pop_email_batch(redis, template_name, batch_size):
+    batch_key = get_email_batch_key(template_name)
+    pipeline = redis.pipeline()
+    pipeline.lrange(batch_key, 0, batch_size - 1)
+    pipeline.ltrim(batch_key, batch_size, -1)
+    batch, _ = pipeline.execute()
+
+    if not batch:
+        redis.srem(EMAIL_BATCH_TEMPLATES_KEY, template_name)
+        # An email queued between the pop and the removal keeps its template listed
+        if redis.llen(batch_key):
+            redis.sadd(EMAIL_BATCH_TEMPLATES_KEY, template_name)
+    return [json.loads(message) for message in batch]
+
+
+def send_email(connection, template, message):
+    # Subjects and plain-text bodies are not HTML, autoescaping would turn & into &amp;
+    subject = template['subject'].render(Context(message['context'], autoescape=False)).strip()
+    body = template['body'].render(Context(message['context'], autoescape=template['html']))
+
+    # Emails queued before the sender was stored go out from settings.DEFAULT_FROM_EMAIL
+    from_email = message.get('from')
+    if template['html']:
+        email = EmailMultiAlternatives(subject=subject, from_email=from_email, to=[message['to']],
+                                       connection=connection)
+        email.attach_alternative(body, 'text/html')
+    else:
+        email = EmailMultiAlternatives(subject=subject, body=body, from_email=from_email, to=[message['to']],
+                                       connection=connection)
+    connection.send_messages([email])
+
+
+def send_email_batch(redis, template_name, batch, connection_pool, token_bucket):
+    template = get_compiled_template(template_name, redis.hget(EMAIL_TEMPLATES_KEY, template_name))
+    connection = None
+    sent = 0
+
+    for message in batch:
+        if token_bucket is not None:
+            token_bucket.consume()
+        try:
+            if connection is None:
+                connection = connection_pool.acquire()
+            try:
+                send_email(connection, template, message)
+            except smtplib.SMTPServerDisconnected:
+                # The pooled connection timed out while idle, reconnect once
+                connection_pool.discard(connection)
+                connection = connection_pool.acquire()
+                send_email(connection, template, message)
+            sent += 1
+        except Exception as e:
+            logger.warning(f'Error sending {template_name} email to {message["to"]} because of {e}')
+            schedule_retry(redis, template_name, message)
+            # A refused recipient leaves the connection usable, anything else gets a fresh one
+            if connection is not None and not isinstance(e, smtplib.SMTPRecipientsRefused):
+                connection_pool.discard(connection)
+                connection = None
+
+    if connection is not None:
+        connection_pool.release(connection)
+    return sent
+
+
+def drain_email_batches(max_seconds=50, send_rate=None, **connection_kwargs):
+    """
+    Sends the queued emails template by template over pooled connections, at most `send_rate`
+    emails per second (settings.EMAIL_SEND_RATE by default, 0 disables the limit).
+    Returns the number of emails sent.
+    """
+    redis = get_redis_connection('default')
+    requeue_due_retries(redis)
+
+    send_rate = settings.EMAIL_SEND_RATE if send_rate is None else send_rate
+    token_bucket = TokenBucket(send_rate, settings.EMAIL_SEND_BURST) if send_rate else None
+    connection_pool = get_connection_pool(**connection_kwargs)
+    deadline = time.monotonic() + max_seconds
+
+    sent = 0
+    for template_name in redis.smembers(EMAIL_BATCH_TEMPLATES_KEY):
+        template_name = template_name.decode()
+        while time.monotonic() < deadline:
+            batch = pop_email_batch(redis, template_name, settings.EMAIL_BATCH_SIZE)
+            if not batch:
+                break
+            sent += send_email_batch(redis, template_name, batch, connection_pool, token_bucket)
+    return sent
+
+
+class QueuedEmailBackend(BaseEmailBackend):
+    """
+    Queues every email sent through Django's mail API, e.g. by send_notification, for
+    drain_email_batches instead of opening an SMTP connection per email. The emails arrive
+    rendered, so they all go through one pass-through template and carry their subject and body
+    as context. They get the pooled connections and the send rate limit, but no per-template
+    batching or template reuse, which only callers of queue_email with a source template get.
+    """
+
+    def send_messages(self, email_messages):
+        for email_message in email_messages:
+            html_bodies = [content for content, mimetype in getattr(email_message, 'alternatives', [])
+                           if mimetype == 'text/html']
+            html = bool(html_bodies) or email_message.content_subtype == 'html'
+            body = html_bodies[0] if html_bodies else email_message.body
+            for recipient in email_message.recipients():
+                if html:
+                    queue_email(RENDERED_HTML_TEMPLATE_NAME, RENDERED_SUBJECT, RENDERED_HTML_BODY, recipient,
+                                {'subject': email_message.subject, 'body': body}, html=True,
+                                from_email=email_message.from_email)
+                else:
+                    queue_email(RENDERED_TEMPLATE_NAME, RENDERED_SUBJECT, RENDERED_BODY, recipient,
+                                {'subject': email_message.subject, 'body': body},
+                                from_email=email_message.from_email)
+        return len(email_messages)
@@ -0,0 +1,45 @@
+import time
+
+from django.conf import settings
+from django.core.mail import EmailMultiAlternatives, get_connection
+from django.core.management.base import BaseCommand
+
+from notification_manager.mailer import queue_email, drain_email_batches
+
+BENCHMARK_TEMPLATE_NAME = 'benchmark'
+BENCHMARK_SUBJECT = 'Test assigned: {{ test_name }}'
+BENCHMARK_BODY = 'Hi {{ user_name }},\n\nThe test {{ test_name }} has been assigned to you.\n'
+
+
+class Command(BaseCommand):
+    help = "Compare per-email SMTP connections with the batched, pooled delivery, run against run_smtp_sink"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--count', type=int, default=500)
+        parser.add_argument('--host', default='127.0.0.1')
+        parser.add_argument('--port', type=int, default=1025)
+
+    def handle(self, *args, **options):
+        count = options['count']
+        connection_kwargs = {'host': options['host'], 'port': options['port'], 'use_tls': False,
+                             'username': '', 'password': ''}
+
+        start = time.perf_counter()
+        for index in range(count):
+            # One connection per email, as when every notification sends on its own
+            connection = get_connection(backend=settings.EMAIL_DELIVERY_BACKEND, fail_silently=False,
+                                        **connection_kwargs)
+            EmailMultiAlternatives(subject=f'Test assigned: Mock {index}', body=BENCHMARK_BODY,
+                                   to=[f'student{index}@example.com'], connection=connection).send()
+        self.report('per-email connections', count, time.perf_counter() - start)
+
+        for index in range(count):
+            queue_email(BENCHMARK_TEMPLATE_NAME, BENCHMARK_SUBJECT, BENCHMARK_BODY, f'student{index}@example.com',
+                        {'user_name': f'Student {index}', 'test_name': f'Mock {index}'})
+
+        start = time.perf_counter()
+        sent = drain_email_batches(max_seconds=3600, send_rate=0, **connection_kwargs)
+        self.report('batched and pooled', sent, time.perf_counter() - start)
+
+    def report(self, label, sent, elapsed):
+        self.stdout.write(f'{label:<22} {sent:6d} emails  {elapsed:8.2f} s  {sent / elapsed:8.1f} emails/s')
@@ -0,0 +1,71 @@
+import socketserver
+import threading
+
+from django.core.management.base import BaseCommand
+
+
+class SMTPSinkHandler(socketserver.StreamRequestHandler):
+    """
+    Speaks just enough SMTP for Django's SMTP backend, accepts every message and only counts it.
+    """
+
+    def reply(self, line):
+        self.wfile.write(f'{line}\r\n'.encode())
+
+    def handle(self):
+        self.reply('220 smtp-sink ready')
+        for line in self.rfile:
+            command = line.decode(errors='replace').strip().upper()
+            if command.startswith(('EHLO', 'HELO')):
+                self.reply('250 smtp-sink')
+            elif command == 'DATA':
+                self.reply('354 End data with <CR><LF>.<CR><LF>')
+                for data_line in self.rfile:
+                    if data_line.rstrip(b'\r\n') == b'.':
+                        break
+                self.server.count_message()
+                self.reply('250 OK')
+            elif command == 'QUIT':
+                self.reply('221 Bye')
+                return
+            else:
+                # MAIL, RCPT, RSET and NOOP
+                self.reply('250 OK')
+
+
+class CountingSMTPServer(socketserver.ThreadingTCPServer):
+    """
+    Local SMTP stand-in that accepts every message and only counts them, one thread per connection.
+    """
+    allow_reuse_address = True
+    daemon_threads = True
+
+    def __init__(self, server_address, stdout, report_every):
+        super().__init__(server_address, SMTPSinkHandler)
+        self.stdout = stdout
+        self.report_every = report_every
+        self.received = 0
+        self.lock = threading.Lock()
+
+    def count_message(self):
+        with self.lock:
+            self.received += 1
+            if self.received % self.report_every == 0:
+                self.stdout.write(f'Received {self.received} messages')
+
+
+class Command(BaseCommand):
+    help = "Run a local SMTP server that accepts and discards email, for testing the email delivery"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--host', default='127.0.0.1')
+        parser.add_argument('--port', type=int, default=1025)
+        parser.add_argument('--report-every', type=int, default=100)
+
+    def handle(self, *args, **options):
+        with CountingSMTPServer((options['host'], options['port']), self.stdout, options['report_every']) as server:
+            self.stdout.write(f'SMTP sink listening on {options["host"]}:{options["port"]}')
+            try:
+                server.serve_forever()
+            except KeyboardInterrupt:
+                pass
@@ -0,0 +1,155 @@
+import json
+from collections import Counter, defaultdict
+
+from django.db import connection
+from django.db.models import Q
+from django_redis import get_redis_connection
+
+from notification_manager.models import Notification
+
+NOTIFICATION_READ_PENDING_KEY = 'notification_read_pending'
+READ_STATE_BATCH_SIZE = 500
+# How long reading a test of a digest still marks the digest as read
+DIGEST_REFERENCES_TIMEOUT = 30 * 24 * 60 * 60
+
+# Category of the notifications that point at a reference, e.g. a test submission
+NOTIFICATION_CATEGORIES = {
+    Notification.TEST_ASSIGNED_NOTIFICATION: Notification.TEST,
+}
+
+
+# Takes ARGV[1] from the unread count in KEYS[1], without going below zero for notifications that were
+# sent before the count was kept
+DECREMENT_UNREAD_COUNT_SCRIPT = """
+local count = redis.call('DECRBY', KEYS[1], ARGV[1])
+if count < 0 then
+    redis.call('SET', KEYS[1], 0)
+end
+return count
+"""
+
+
+def get_unread_count_key(user_id):
+    return f'notification_unread_count_{user_id}'
+
+
+def add_unread_notification(notification_name, user_id):
+    """
+    Counts a notification that is about to be created as unread, for the notifications that can be
+    marked as read by reference.
+    """
+    if notification_name in NOTIFICATION_CATEGORIES:
+        get_redis_connection('default').incr(get_unread_count_key(user_id))
+
+
+def get_unread_count(user_id):
+    """
+    Number of unread notifications of the user, for the notification badge, without a COUNT query.
+    """
+    count = get_redis_connection('default').get(get_unread_count_key(user_id))
+    return max(int(count), 0) if count is not None else 0
+
+
+def get_digest_references_key(user_id):
+    return f'notification_digest_references_{user_id}'
+
+
+def get_reference_member(category, reference_id):
+    return f'{category}:{reference_id}'
+
+
+def record_digest_references(notification_name, user_id, reference_ids):
+    """
+    A digest notification is stored with the last of its reference ids, maps the others to it so that
+    reading any of them marks the digest as read.
+    """
+    category = NOTIFICATION_CATEGORIES.get(notification_name)
+    if category is None:
+        return
+
+    digest_reference_id = reference_ids[-1]
+    key = get_digest_references_key(user_id)
+    pipeline = get_redis_connection('default').pipeline()
+    pipeline.hset(key, mapping={get_reference_member(category, reference_id): digest_reference_id
+                                for reference_id in reference_ids[:-1]})
+    pipeline.expire(key, DIGEST_REFERENCES_TIMEOUT)
+    pipeline.execute()
+
+
+def queue_mark_as_read(user_id, category, reference_id):
+    """
+    Records that the notifications of a reference were read, the flusher applies it. Marking the
+    same reference twice before a flush costs nothing.
+    """
+    get_redis_connection('default').sadd(NOTIFICATION_READ_PENDING_KEY, json.dumps([user_id, category, reference_id]))
+
+
+def get_digest_reference_ids(redis, changes):
+    # The reference id of the digest each change belongs to, None when it was sent on its own
+    pipeline = redis.pipeline()
+    for user_id, category, reference_id in changes:
+        pipeline.hget(get_digest_references_key(user_id), get_reference_member(category, reference_id))
+    return [int(reference_id) if reference_id is not None else None for reference_id in pipeline.execute()]
+
+
+def group_reference_ids(changes, digest_reference_ids):
+    reference_ids = defaultdict(set)
+    for (user_id, category, reference_id), digest_reference_id in zip(changes, digest_reference_ids):
+        reference_ids[(user_id, category)].add(reference_id)
+        if digest_reference_id is not None:
+            reference_ids[(user_id, category)].add(digest_reference_id)
+    return reference_ids
+
+
+def mark_batch_as_read(reference_ids):
+    """
+    Marks the notifications of the references, grouped per user and category, as read with one
+    UPDATE ... RETURNING. Returns the number of notifications marked per user.
+    """
+    condition = Q()
+    for (user_id, category), ids in reference_ids.items():
+        condition |= Q(user_id=user_id, category=category, reference_id__in=ids)
+    unread = Notification.objects.filter(condition, is_read=False).values('pk')
+    unread_sql, unread_params = unread.query.sql_with_params()
+
+    opts = Notification._meta
+    quote_name = connection.ops.quote_name
+    is_read_column = quote_name(opts.get_field('is_read').column)
+    # Checking is_read again keeps a concurrent flush from counting the same notification twice
+    sql = (f'UPDATE {quote_name(opts.db_table)} SET {is_read_column} = %s '
+           f'WHERE {quote_name(opts.pk.column)} IN ({unread_sql}) AND {is_read_column} = %s '
+           f'RETURNING {quote_name(opts.get_field("user").column)}')
+    with connection.cursor() as cursor:
+        cursor.execute(sql, [True, *unread_params, False])
+        return Counter(user_id for user_id, in cursor.fetchall())
+
+
+def decrement_unread_counts(redis, read_counts):
+    pipeline = redis.pipeline()
+    for user_id, read_count in read_counts.items():
+        pipeline.eval(DECREMENT_UNREAD_COUNT_SCRIPT, 1, get_unread_count_key(user_id), read_count)
+    pipeline.execute()
+
+
+def flush_read_state():
+    """
+    Applies the pending read-state changes in batches, each distinct change once.
+    Returns the number of changes applied.
+    """
+    redis = get_redis_connection('default')
+
+    flushed = 0
+    while True:
+        pending = redis.spop(NOTIFICATION_READ_PENDING_KEY, READ_STATE_BATCH_SIZE)
+        if not pending:
+            break
+        try:
+            changes = [json.loads(change) for change in pending]
+            read_counts = mark_batch_as_read(group_reference_ids(changes, get_digest_reference_ids(redis, changes)))
+        except Exception:
+            # Put the batch back, the next flush picks it up
+            redis.sadd(NOTIFICATION_READ_PENDING_KEY, *pending)
+            raise
+        decrement_unread_counts(redis, read_counts)
+        flushed += len(pending)
+    return flushed
@@ -0,0 +1,29 @@
+from django.core.cache import cache
+
+from notification_manager.digest import send_due_digests
+from notification_manager.mailer import drain_email_batches
+from notification_manager.read_state import flush_read_state
+from sTest.celery import app
+
+EMAIL_DRAIN_LOCK_KEY = 'email_drain_lock'
+
+
+@app.task
+def drain_email_queue():
+    # A single drainer at a time keeps the send rate global
+    if not cache.add(EMAIL_DRAIN_LOCK_KEY, True, timeout=120):
+        return
+    try:
+        drain_email_batches()
+    finally:
+        cache.delete(EMAIL_DRAIN_LOCK_KEY)
+
+
+@app.task
+def send_notification_digests():
+    send_due_digests()
+
+
+@app.task
+def flush_notification_read_state():
+    flush_read_state()
@@ -0,0 +1,171 @@
+import io
+import json
+import threading
+from unittest import mock
+
+from django.core import mail
+from django.core.mail import EmailMessage, EmailMultiAlternatives, get_connection
+from django.test import SimpleTestCase, TestCase, override_settings
+
+from notification_manager.digest import merge_notification_params, queue_notification
+from notification_manager.mailer import QueuedEmailBackend, get_compiled_template, send_email, \
+    RENDERED_TEMPLATE_NAME, RENDERED_SUBJECT, RENDERED_BODY
+from notification_manager.management.commands.run_smtp_sink import CountingSMTPServer
+from notification_manager.models import NotificationTemplate, Notification
+from notification_manager.read_state import NOTIFICATION_READ_PENDING_KEY, flush_read_state, group_reference_ids, \
+    add_unread_notification, get_unread_count_key
+
+LOCMEM_EMAIL_BACKEND = 'django.core.mail.backends.locmem.EmailBackend'
+
+
+def build_template_source(subject, body, html=False):
+    return json.dumps({'subject': subject, 'body': body, 'html': html}).encode()
+
+
+@override_settings(EMAIL_BACKEND=LOCMEM_EMAIL_BACKEND)
+class SendEmailTests(SimpleTestCase):
+    def send(self, template_name, template_source, context):
+        template = get_compiled_template(template_name, template_source)
+        send_email(get_connection(), template, {'to': 'student@example.com', 'context': context, 'attempts': 0})
+        return mail.outbox[-1]
+
+    def test_plain_text_email_is_not_html_escaped(self):
+        email = self.send('plain', build_template_source('{{ test_name }} assigned', 'Hi {{ user_name }},'),
+                          {'test_name': 'Physics & Maths', 'user_name': "O'Neil <Jr>"})
+
+        self.assertEqual(email.subject, 'Physics & Maths assigned')
+        self.assertEqual(email.body, "Hi O'Neil <Jr>,")
+
+    def test_queued_plain_text_email_is_sent_as_rendered(self):
+        email = self.send(RENDERED_TEMPLATE_NAME, build_template_source(RENDERED_SUBJECT, RENDERED_BODY),
+                          {'subject': 'Reset your password', 'body': 'Open https://example.com/?token=a&b=c'})
+
+        self.assertEqual(email.body, 'Open https://example.com/?token=a&b=c')
+
+    def test_html_email_escapes_its_context(self):
+        email = self.send('html', build_template_source('{{ test_name }}', '<p>{{ test_name }}</p>', html=True),
+                          {'test_name': 'Physics & Maths'})
+
+        self.assertEqual(email.subject, 'Physics & Maths')
+        self.assertEqual(email.alternatives, [('<p>Physics &amp; Maths</p>', 'text/html')])
+
+
+class SMTPSinkTests(SimpleTestCase):
+    def test_sink_counts_the_messages_of_the_smtp_backend(self):
+        server = CountingSMTPServer(('127.0.0.1', 0), io.StringIO(), report_every=100)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        self.addCleanup(server.server_close)
+        self.addCleanup(server.shutdown)
+
+        connection = get_connection(backend='django.core.mail.backends.smtp.EmailBackend', host='127.0.0.1',
+                                    port=server.server_address[1], username='', password='', use_tls=False)
+        sent = connection.send_messages([
+            EmailMessage(subject='Welcome', body=f'Hi\n.\n{index}', to=['student@example.com'])
+            for index in range(3)
+        ])
+        connection.close()
+
+        self.assertEqual(sent, 3)
+        self.assertEqual(server.received, 3)
+
+
+class QueuedEmailBackendTests(SimpleTestCase):
+    @mock.patch('notification_manager.mailer.queue_email')
+    def test_sent_emails_are_queued_per_recipient(self, queue_email):
+        email = EmailMessage(subject='Welcome', body='Hi & welcome', from_email='noreply@example.com',
+                             to=['student@example.com', 'parent@example.com'])
+
+        sent = QueuedEmailBackend().send_messages([email])
+
+        self.assertEqual(sent, 1)
+        self.assertEqual([call.args[3] for call in queue_email.call_args_list],
+                         ['student@example.com', 'parent@example.com'])
+        self.assertEqual(queue_email.call_args.args[4], {'subject': 'Welcome', 'body': 'Hi & welcome'})
+        self.assertEqual(queue_email.call_args.kwargs['from_email'], 'noreply@example.com')
+
+    @mock.patch('notification_manager.mailer.queue_email')
+    def test_html_alternative_is_queued_as_html(self, queue_email):
+        email = EmailMultiAlternatives(subject='Welcome', body='Hi', to=['student@example.com'])
+        email.attach_alternative('<p>Hi</p>', 'text/html')
+
+        QueuedEmailBackend().send_messages([email])
+
+        self.assertEqual(queue_email.call_args.args[4]['body'], '<p>Hi</p>')
+        self.assertIs(queue_email.call_args.kwargs['html'], True)
+
+
+class NotificationDigestTests(SimpleTestCase):
+    def test_digest_keeps_the_latest_reference(self):
+        params = merge_notification_params([
+            {NotificationTemplate.TEST_NAME: 'Mock 1', NotificationTemplate.REFERENCE_ID: 11},
+            {NotificationTemplate.TEST_NAME: 'Mock 2', NotificationTemplate.REFERENCE_ID: 12},
+        ])
+
+        self.assertEqual(params[NotificationTemplate.TEST_NAME], 'Mock 1, Mock 2')
+        self.assertEqual(params[NotificationTemplate.REFERENCE_ID], 12)
+
+    @mock.patch('notification_manager.digest.get_redis_connection')
+    @mock.patch('notification_manager.digest.send_notification')
+    def test_registration_notification_is_sent_immediately(self, send_notification, get_redis_connection):
+        params = {NotificationTemplate.USER_NAME: 'Student'}
+
+        queue_notification(notification_name=Notification.REGISTRATION_NOTIFICATION, params=params, user_id=1)
+
+        send_notification.delay.assert_called_once_with(notification_name=Notification.REGISTRATION_NOTIFICATION,
+                                                        params=params, user_id=1)
+        get_redis_connection.assert_not_called()
+
+
+class ReadStateFlushTests(TestCase):
+    def mock_redis(self, get_redis_connection, pending, digest_reference_ids=None):
+        redis = get_redis_connection.return_value
+        redis.spop.side_effect = [[json.dumps(change).encode() for change in pending], []]
+        redis.pipeline.return_value.execute.return_value = digest_reference_ids or [None] * len(pending)
+        return redis
+
+    @mock.patch('notification_manager.read_state.get_redis_connection')
+    def test_flush_marks_a_batch_as_read_with_one_update(self, get_redis_connection):
+        self.mock_redis(get_redis_connection, [[1, Notification.TEST, 11], [1, Notification.TEST, 12],
+                                               [2, Notification.TEST, 13]])
+
+        with self.assertNumQueries(1):
+            flushed = flush_read_state()
+
+        self.assertEqual(flushed, 3)
+
+    @mock.patch('notification_manager.read_state.mark_batch_as_read', return_value={1: 2, 2: 1})
+    @mock.patch('notification_manager.read_state.get_redis_connection')
+    def test_flush_takes_the_read_notifications_from_the_unread_counts(self, get_redis_connection,
+                                                                       mark_batch_as_read):
+        redis = self.mock_redis(get_redis_connection, [[1, Notification.TEST, 11], [1, Notification.TEST, 12],
+                                                       [2, Notification.TEST, 13]])
+
+        flush_read_state()
+
+        decrements = {call.args[2]: call.args[3] for call in redis.pipeline.return_value.eval.call_args_list}
+        self.assertEqual(decrements, {get_unread_count_key(1): 2, get_unread_count_key(2): 1})
+
+    @mock.patch('notification_manager.read_state.get_redis_connection')
+    def test_only_notifications_read_by_reference_are_counted_as_unread(self, get_redis_connection):
+        add_unread_notification(notification_name=Notification.TEST_ASSIGNED_NOTIFICATION, user_id=1)
+        add_unread_notification(notification_name=Notification.REGISTRATION_NOTIFICATION, user_id=1)
+
+        get_redis_connection.return_value.incr.assert_called_once_with(get_unread_count_key(1))
+
+    @mock.patch('notification_manager.read_state.mark_batch_as_read', side_effect=RuntimeError)
+    @mock.patch('notification_manager.read_state.get_redis_connection')
+    def test_failed_batch_is_put_back(self, get_redis_connection, mark_batch_as_read):
+        redis = self.mock_redis(get_redis_connection, [[1, Notification.TEST, 11], [2, Notification.TEST, 13]])
+
+        with self.assertRaises(RuntimeError):
+            flush_read_state()
+
+        self.assertEqual(redis.sadd.call_args.args[0], NOTIFICATION_READ_PENDING_KEY)
+        self.assertEqual(len(redis.sadd.call_args.args[1:]), 2)
+
+    def test_reading_a_test_of_a_digest_marks_the_digest_read(self):
+        changes = [[1, Notification.TEST, 11], [1, Notification.TEST, 13], [2, Notification.TEST, 11]]
+
+        reference_ids = group_reference_ids(changes, [12, None, None])
+
+        self.assertEqual(dict(reference_ids), {(1, Notification.TEST): {11, 12, 13}, (2, Notification.TEST): {11}})
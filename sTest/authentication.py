@@ -0,0 +1,138 @@
+import uuid
+
+from django.conf import settings
+from django.contrib.auth import SESSION_KEY, BACKEND_SESSION_KEY, HASH_SESSION_KEY
+from django.core.cache import cache
+from django.db.models import DEFERRED
+from django.utils.crypto import constant_time_compare
+from rest_framework.authentication import SessionAuthentication
+
+from user_manager.models import User, Role, StudentMetadata
+
+AUTH_CONTEXT_TIMEOUT = settings.SESSION_COOKIE_AGE
+
+# The password is not cached, it stays deferred on the rebuilt user so that save() never overwrites it
+USER_CONTEXT_FIELDS = ['id', 'email', 'phone_number', 'name', 'role_id', 'is_active', 'change_password',
+                       'is_staff', 'is_superuser', 'created_at', 'updated_at']
+STUDENT_METADATA_CONTEXT_FIELDS = ['id', 'student_id', 'father_id', 'mother_id', 'faculty_id', 'mentor_id',
+                                   'created_at', 'updated_at']
+
+
+def get_auth_context_key(session_key):
+    return f'auth_context_{session_key}'
+
+
+def get_user_version_key(user_id):
+    return f'auth_user_version_{user_id}'
+
+
+def bump_user_version(user_id):
+    """
+    Invalidates every cached auth context of the user, across all of their sessions.
+    """
+    cache.set(get_user_version_key(user_id), uuid.uuid4().hex, timeout=None)
+
+
+def get_user_version(user_id):
+    version_key = get_user_version_key(user_id)
+    version = cache.get(version_key)
+    if version is None:
+        cache.add(version_key, uuid.uuid4().hex, timeout=None)
+        version = cache.get(version_key)
+    return version
+
+
+def clear_auth_context(session_key):
+    cache.delete(get_auth_context_key(session_key))
+
+
+def build_auth_context(user, version, session_hash):
+    try:
+        student_metadata = user.student_metadata
+    except StudentMetadata.DoesNotExist:
+        student_metadata = None
+
+    return {
+        'version': version,
+        'session_hash': session_hash,
+        'user': {field: getattr(user, field) for field in USER_CONTEXT_FIELDS},
+        'student_metadata': {field: getattr(student_metadata, field) for field in
+                             STUDENT_METADATA_CONTEXT_FIELDS} if student_metadata else None,
+    }
+
+
+def build_instance_from_context(model, data):
+    # from_db assigns the values by position in concrete field order, fields missing from the context stay deferred
+    field_names = [field.attname for field in model._meta.concrete_fields]
+    values = [data.get(field_name, DEFERRED) for field_name in field_names]
+    return model.from_db(model.objects.db, field_names, values)
+
+
+def build_user_from_auth_context(context):
+    user = build_instance_from_context(User, context['user'])
+    user.role = Role.get_role_by_id(user.role_id)
+
+    metadata_data = context['student_metadata']
+    student_metadata = None
+    if metadata_data is not None:
+        student_metadata = build_instance_from_context(StudentMetadata, metadata_data)
+        StudentMetadata.student.field.set_cached_value(student_metadata, user)
+    # Cache the reverse side as well (including a missing row) so `user.student_metadata` does not query
+    User.student_metadata.related.set_cached_value(user, student_metadata)
+    return user
+
+
+def get_user_for_session(session):
+    """
+    Returns the user logged into the session, served from the cached auth context when it is still current.
+    """
+    user_id = session.get(SESSION_KEY)
+    session_key = session.session_key
+    if user_id is None or session_key is None or session.get(BACKEND_SESSION_KEY) not in settings.AUTHENTICATION_BACKENDS:
+        return None
+
+    context_key = get_auth_context_key(session_key)
+    version_key = get_user_version_key(user_id)
+    cached = cache.get_many([context_key, version_key])
+
+    version = cached.get(version_key)
+    if version is None:
+        version = get_user_version(user_id)
+
+    session_hash = session.get(HASH_SESSION_KEY) or ''
+    context = cached.get(context_key)
+    if context is not None and context['version'] == version and constant_time_compare(context['session_hash'],
+                                                                                       session_hash):
+        return build_user_from_auth_context(context)
+
+    # Load the user, the role and the student metadata in a single query
+    user = User.objects.select_related('role', 'student_metadata').filter(pk=user_id).first()
+    if user is None:
+        return None
+
+    # Same check as django.contrib.auth.get_user, a password change invalidates the other sessions
+    if not constant_time_compare(session_hash, user.get_session_auth_hash()):
+        session.flush()
+        return None
+
+    cache.set(context_key, build_auth_context(user, version, session_hash), timeout=AUTH_CONTEXT_TIMEOUT)
+    return user
+
+
+class CachedSessionAuthentication(SessionAuthentication):
+    """
+    Session authentication that resolves the user, role and student metadata from a per-session
+    context cached in Redis, instead of querying them on every request.
+    """
+
+    def authenticate(self, request):
+        user = get_user_for_session(request._request.session)
+
+        if not user or not user.is_active:
+            return None
+
+        # Keep Django's request.user in sync so that nothing downstream loads the user again
+        request._request.user = user
+        self.enforce_csrf(request)
+
+        return (user, None)
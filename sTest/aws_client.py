@@ -4,6 +4,10 @@ import os
 import boto3
 
 
+def get_presigned_url_expiry():
+    return min(604800, int(os.environ.get('AWS_PRESIGNED_URL_EXPIRY', "1800")))
+
+
 class AwsStorageClient:
     def __init__(self, logger=None):
         self.set_logger(logger)
@@ -30,7 +34,7 @@ class AwsStorageClient:
 
     def get_url(self, source, filename):
         object_key = os.path.join(source, filename)
-        expiration_time = min(604800, int(os.environ.get('AWS_PRESIGNED_URL_EXPIRY', "1800")))
+        expiration_time = get_presigned_url_expiry()
 
         url = self.s3_client.generate_presigned_url(
             ClientMethod='get_object',
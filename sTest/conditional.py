@@ -0,0 +1,61 @@
+import functools
+
+from django.http import HttpResponse
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date, quote_etag
+
+
+def set_validators(response, etag=None, last_modified=None, cache_control='private, no-cache'):
+    """
+    Adds the validators and the Cache-Control header to a response, `last_modified` is a UNIX timestamp.
+    """
+    if etag is not None:
+        response['ETag'] = etag
+    if last_modified is not None:
+        response['Last-Modified'] = http_date(last_modified)
+    response['Cache-Control'] = cache_control
+    return response
+
+
+def get_rendered_response(request, content, etag, last_modified=None, cache_control='private, no-cache'):
+    """
+    Returns pre-rendered JSON with its validators, or an empty 304 when the client already holds it.
+    `last_modified` is a UNIX timestamp.
+    """
+    response = get_conditional_response(request, etag=etag, last_modified=last_modified)
+    if response is None:
+        response = HttpResponse(content, content_type='application/json')
+    return set_validators(response, etag, last_modified, cache_control)
+
+
+def conditional_response(get_validators, cache_control='private, no-cache'):
+    """
+    Adds conditional request handling to a read action of a viewset.
+
+    `get_validators` is called with the view, the request and the action arguments and returns an
+    (etag, last_modified) pair, where last_modified is a datetime and either may be None. It should
+    be a cheap query, e.g. on `updated_at` or a version key, since a matching If-None-Match or
+    If-Modified-Since is answered with a 304 before the action runs and anything is serialized.
+    """
+    def decorator(view_method):
+        @functools.wraps(view_method)
+        def wrapper(view, request, *args, **kwargs):
+            etag, last_modified = get_validators(view, request, *args, **kwargs)
+            if etag is not None:
+                etag = quote_etag(str(etag))
+            if last_modified is not None:
+                last_modified = int(last_modified.timestamp())
+
+            response = None
+            if etag is not None or last_modified is not None:
+                response = get_conditional_response(request, etag=etag, last_modified=last_modified)
+            if response is None:
+                response = view_method(view, request, *args, **kwargs)
+
+            if response.status_code in (200, 304):
+                set_validators(response, etag, last_modified, cache_control)
+            return response
+
+        return wrapper
+
+    return decorator
@@ -0,0 +1,93 @@
+import logging
+import time
+
+from django.core.cache import cache
+from django.db import connection, transaction
+from django.utils import timezone
+
+logger = logging.getLogger('Maintenance')
+
+
+def get_maintenance_run_key(name):
+    return f'maintenance_job_{name}'
+
+
+def get_last_maintenance_run(name):
+    return cache.get(get_maintenance_run_key(name))
+
+
+class MaintenanceJob:
+    """
+    Periodic state transition applied as chunked, set-based UPDATE ... RETURNING statements.
+
+    Subclasses set `name` and `model`, return the rows to transition from `get_queryset` and the new
+    values from `get_updates`. Each chunk locks its rows with SKIP LOCKED, so concurrent runs work on
+    disjoint rows. `on_changed` receives the `returning` columns of every changed row once its chunk
+    has committed, as the UPDATE bypasses save() and its signals.
+    """
+    name = None
+    model = None
+    chunk_size = 1000
+    returning = ['id']
+
+    def get_queryset(self):
+        raise NotImplementedError
+
+    def get_updates(self):
+        raise NotImplementedError
+
+    def on_changed(self, rows):
+        pass
+
+    def get_update_sql(self):
+        opts = self.model._meta
+        quote_name = connection.ops.quote_name
+
+        chunk = self.get_queryset().select_for_update(skip_locked=True).order_by('pk').values('pk')[:self.chunk_size]
+        chunk_sql, chunk_params = chunk.query.sql_with_params()
+
+        assignments = []
+        params = []
+        for field_name, value in self.get_updates().items():
+            field = opts.get_field(field_name)
+            assignments.append(f'{quote_name(field.column)} = %s')
+            params.append(field.get_db_prep_save(value, connection))
+
+        returning = ', '.join(quote_name(opts.get_field(field_name).column) for field_name in self.returning)
+        sql = (f'UPDATE {quote_name(opts.db_table)} SET {", ".join(assignments)} '
+               f'WHERE {quote_name(opts.pk.column)} IN ({chunk_sql}) RETURNING {returning}')
+        return sql, params + list(chunk_params)
+
+    def run(self):
+        started_at = timezone.now()
+        start = time.monotonic()
+
+        changed_count = 0
+        chunk_count = 0
+        while True:
+            with transaction.atomic():
+                # select_for_update only compiles inside a transaction
+                sql, params = self.get_update_sql()
+                with connection.cursor() as cursor:
+                    cursor.execute(sql, params)
+                    rows = [dict(zip(self.returning, row)) for row in cursor.fetchall()]
+            if not rows:
+                break
+
+            chunk_count += 1
+            changed_count += len(rows)
+            self.on_changed(rows)
+
+            if len(rows) < self.chunk_size:
+                break
+
+        run = {
+            'started_at': started_at,
+            'duration': round(time.monotonic() - start, 3),
+            'changed_count': changed_count,
+            'chunk_count': chunk_count,
+        }
+        cache.set(get_maintenance_run_key(self.name), run, timeout=None)
+        logger.info(f'Maintenance job {self.name} changed {changed_count} rows in {chunk_count} chunks '
+                    f'in {run["duration"]}s')
+        return run
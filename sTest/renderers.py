@@ -0,0 +1,36 @@
+import orjson
+from django.http import HttpResponse
+from rest_framework.renderers import BaseRenderer
+from rest_framework.utils.encoders import JSONEncoder
+
+_drf_encoder = JSONEncoder()
+
+
+def dumps(data):
+    """
+    Serializes to JSON bytes with orjson. Datetimes and the types orjson does not handle natively
+    (Decimal, lazy translations, ...) go through the DRF encoder, so the output matches JSONRenderer.
+    """
+    return orjson.dumps(data, default=_drf_encoder.default,
+                        option=orjson.OPT_NON_STR_KEYS | orjson.OPT_PASSTHROUGH_DATETIME)
+
+
+class ORJSONRenderer(BaseRenderer):
+    media_type = 'application/json'
+    format = 'json'
+    charset = None
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None:
+            return b''
+        return dumps(data)
+
+
+class ORJSONResponse(HttpResponse):
+    """
+    JsonResponse rendered with orjson, for views that build their payload by hand.
+    """
+
+    def __init__(self, data, **kwargs):
+        kwargs.setdefault('content_type', 'application/json')
+        super().__init__(content=dumps(data), **kwargs)
@@ -0,0 +1,96 @@
+import logging
+import time
+
+from django.conf import settings
+from django.contrib.sessions.backends.db import SessionStore as DBStore
+from django.core.cache import caches
+from django.utils import timezone
+
+KEY_PREFIX = 'sTest.sessions.redis'
+
+logger = logging.getLogger('Sessions')
+
+
+class SessionStore(DBStore):
+    """
+    Sessions are read from and written to Redis, with the database kept as a durable fallback.
+
+    With SESSION_SAVE_EVERY_REQUEST the middleware saves the session on every call only to push its expiry
+    forward. Such saves are skipped until the remaining age of the stored session drops below
+    SESSION_REFRESH_THRESHOLD, so an unchanged session is rewritten at most once per refresh window.
+    """
+
+    cache_key_prefix = KEY_PREFIX
+
+    def __init__(self, session_key=None):
+        self._cache = caches[settings.SESSION_CACHE_ALIAS]
+        self._stored_expiry = None
+        super().__init__(session_key)
+
+    @property
+    def cache_key(self):
+        return self.cache_key_prefix + self._get_or_create_session_key()
+
+    # Redis is only a fast path, when it is unavailable the session is treated as not cached and the
+    # database serves it
+    def _cache_call(self, method, *args, default=None):
+        try:
+            return getattr(self._cache, method)(*args)
+        except Exception:
+            logger.warning(f'Session cache {method} failed, falling back to the database', exc_info=True)
+            return default
+
+    def load(self):
+        cached = self._cache_call('get', self.cache_key)
+
+        if cached is not None:
+            self._stored_expiry = cached['expires_at']
+            return cached['data']
+
+        s = self._get_session_from_db()
+        if not s:
+            return {}
+
+        data = self.decode(s.session_data)
+        self._stored_expiry = s.expire_date.timestamp()
+        self._cache_call('set', self.cache_key, {'data': data, 'expires_at': self._stored_expiry},
+                         self.get_expiry_age(expiry=s.expire_date))
+        return data
+
+    def exists(self, session_key):
+        return self._cache_call('has_key', self.cache_key_prefix + session_key, default=False) or \
+            super().exists(session_key)
+
+    def save(self, must_create=False):
+        if self.session_key is None:
+            return self.create()
+
+        if not must_create and not self.modified and self._stored_expiry is not None:
+            if self._stored_expiry - time.time() > settings.SESSION_REFRESH_THRESHOLD:
+                return
+
+        super().save(must_create=must_create)
+
+        self._stored_expiry = self.get_expiry_date().timestamp()
+        self._cache_call('set', self.cache_key, {'data': self._get_session(no_load=must_create),
+                                                 'expires_at': self._stored_expiry},
+                         self.get_expiry_age())
+
+    def delete(self, session_key=None):
+        super().delete(session_key)
+        if session_key is None:
+            if self.session_key is None:
+                return
+            session_key = self.session_key
+        self._cache_call('delete', self.cache_key_prefix + session_key)
+
+    @classmethod
+    def clear_expired(cls, batch_size=5000):
+        # Expired rows are removed in chunks so the cleanup never holds a long lock on the table
+        model = cls.get_model_class()
+        while True:
+            session_keys = list(model.objects.filter(expire_date__lt=timezone.now())
+                                .values_list('session_key', flat=True)[:batch_size])
+            if not session_keys:
+                break
+            model.objects.filter(session_key__in=session_keys).delete()
@@ -52,6 +52,11 @@ SESSION_COOKIE_DOMAIN = None
 
 SESSION_COOKIE_AGE = 10800
 
+SESSION_ENGINE = 'sTest.sessions'
+SESSION_CACHE_ALIAS = 'default'
+# An unchanged session is only rewritten once its remaining age drops below this, at most every 15 minutes
+SESSION_REFRESH_THRESHOLD = SESSION_COOKIE_AGE - 15 * 60
+
 # Application definition
 
 INSTALLED_APPS = [
@@ -61,6 +66,7 @@ INSTALLED_APPS = [
     'django.contrib.sessions',
     'django.contrib.messages',
     'django.contrib.staticfiles',
+    'django.contrib.postgres',
     'django_filters',
     'rest_framework',
     'rest_framework.authtoken',
@@ -74,6 +80,7 @@ INSTALLED_APPS = [
 
 MIDDLEWARE = [
     'corsheaders.middleware.CorsMiddleware',
+    'django.middleware.gzip.GZipMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -159,12 +166,32 @@ AUTHENTICATION_BACKENDS = [
 
 REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': [
-        'rest_framework.authentication.SessionAuthentication',
+        'sTest.authentication.CachedSessionAuthentication',
     ],
     'DEFAULT_PERMISSION_CLASSES': [
         'rest_framework.permissions.IsAuthenticated',
     ],
     'DEFAULT_FILTER_BACKENDS': ['django_filters.rest_framework.DjangoFilterBackend'],
+    'DEFAULT_RENDERER_CLASSES': [
+        'sTest.renderers.ORJSONRenderer',
+        'rest_framework.renderers.BrowsableAPIRenderer',
+    ],
+    'DEFAULT_PARSER_CLASSES': [
+        'sTest.parsers.ORJSONParser',
+        'rest_framework.parsers.FormParser',
+        'rest_framework.parsers.MultiPartParser',
+    ],
+    # Requests come through nginx, the client IP is the last X-Forwarded-For entry
+    'NUM_PROXIES': 1,
+}
+
+# Token buckets of the auth endpoints as (scope, capacity, period in seconds), scope being 'ip' or 'email'
+AUTH_RATE_LIMITS = {
+    'login': [('ip', 30, 60), ('email', 10, 300)],
+    'register': [('ip', 10, 600), ('email', 3, 600)],
+    'verify_otp': [('ip', 30, 600), ('email', 5, 600)],
+    'forgot_password': [('ip', 10, 600), ('email', 3, 900)],
+    'reset_password': [('ip', 10, 600)],
 }
 
 LOGGING = {
@@ -235,12 +262,23 @@ LOGGING = {
     },
 }
 
-EMAIL_BACKEND = 'django.core.mail.backends.smtp.EmailBackend'
+# Notification emails are queued and sent in batches by notification_manager.tasks.drain_email_queue
+EMAIL_BACKEND = 'notification_manager.mailer.QueuedEmailBackend'
+EMAIL_DELIVERY_BACKEND = 'django.core.mail.backends.smtp.EmailBackend'
 EMAIL_HOST = 'smtp.gmail.com'
 EMAIL_USE_TLS = True
 EMAIL_PORT = 587
 EMAIL_HOST_USER = os.environ.get("EMAIL_HOST_USER")
 EMAIL_HOST_PASSWORD = os.environ.get("EMAIL_HOST_PASSWORD")
+# Batched email delivery, see notification_manager.mailer
+EMAIL_BATCH_SIZE = 100
+EMAIL_POOL_SIZE = 2
+EMAIL_SEND_RATE = int(os.environ.get("EMAIL_SEND_RATE", "5"))
+EMAIL_SEND_BURST = 20
+EMAIL_MAX_ATTEMPTS = 5
+EMAIL_RETRY_BACKOFF = 30
+# Notifications of the same type for the same user within this many seconds are sent as one digest
+NOTIFICATION_DIGEST_WINDOW = int(os.environ.get("NOTIFICATION_DIGEST_WINDOW", "300"))
 
 CELERY_BROKER_URL = os.environ.get("CELERY_BROKER_URL")
 CELERY_BEAT_SCHEDULE = {
@@ -248,6 +286,31 @@ CELERY_BEAT_SCHEDULE = {
         'task': 'user_manager.tasks.check_and_update_subscriptions',
         'schedule': crontab(hour=23, minute=55),
     },
+    'expire-due-submissions': {
+        'task': 'test_manager.tasks.expire_due_submissions',
+        'schedule': 10.0,
+    },
+    # Backstop for deadlines missing from the expiry schedule, e.g. after a Redis flush
+    'update-expired-test-submissions': {
+        'task': 'user_manager.tasks.update_expired_test_submissions',
+        'schedule': crontab(minute=0),
+    },
+    'clear-expired-sessions': {
+        'task': 'sTest.tasks.clear_expired_sessions',
+        'schedule': crontab(hour=3, minute=30),
+    },
+    'drain-email-queue': {
+        'task': 'notification_manager.tasks.drain_email_queue',
+        'schedule': 15.0,
+    },
+    'send-notification-digests': {
+        'task': 'notification_manager.tasks.send_notification_digests',
+        'schedule': 30.0,
+    },
+    'flush-notification-read-state': {
+        'task': 'notification_manager.tasks.flush_notification_read_state',
+        'schedule': 30.0,
+    },
 }
 
 FRONTEND_URL = os.environ.get("FRONTEND_URL")
@@ -0,0 +1,16 @@
+from django.core.cache import cache
+
+from sTest.celery import app
+from sTest.sessions import SessionStore
+from sTest.utils import store_cached_count, count_sql
+
+
+@app.task
+def refresh_cached_count(using, sql, params, cache_key):
+    store_cached_count(cache_key, count_sql(using, sql, params))
+    cache.delete(f'{cache_key}_refreshing')
+
+
+@app.task
+def clear_expired_sessions():
+    SessionStore.clear_expired()
@@ -0,0 +1,73 @@
+from unittest import mock
+
+from django.core.cache import caches
+from django.test import SimpleTestCase, TestCase, override_settings
+from rest_framework.parsers import JSONParser
+from rest_framework.request import Request
+from rest_framework.test import APIRequestFactory
+
+from sTest.sessions import SessionStore
+from sTest.throttling import AuthRateThrottle, get_bucket_key
+
+LOCMEM_CACHES = {'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}}
+
+
+@override_settings(CACHES=LOCMEM_CACHES)
+class SessionStoreTests(TestCase):
+    def test_session_is_served_from_the_database_when_redis_is_down(self):
+        session = SessionStore()
+        session['user'] = 'student'
+        session.save()
+
+        cache = caches['default']
+        with mock.patch.object(cache, 'get', side_effect=ConnectionError), \
+                mock.patch.object(cache, 'set', side_effect=ConnectionError), \
+                mock.patch.object(cache, 'has_key', side_effect=ConnectionError):
+            store = SessionStore(session.session_key)
+            self.assertEqual(store['user'], 'student')
+            self.assertTrue(store.exists(session.session_key))
+
+            store['user'] = 'admin'
+            store.save()
+
+        # The write went to the database
+        cache.clear()
+        self.assertEqual(SessionStore(session.session_key)['user'], 'admin')
+
+
+@override_settings(AUTH_RATE_LIMITS={'login': [('ip', 30, 60), ('email', 10, 300)]})
+class AuthRateThrottleTests(SimpleTestCase):
+    def allow_request(self, data, action='login'):
+        request = APIRequestFactory().post('/api/user/login/', data, format='json', REMOTE_ADDR='10.0.0.1')
+        throttle = AuthRateThrottle()
+        allowed = throttle.allow_request(Request(request, parsers=[JSONParser()]), mock.Mock(action=action))
+        return allowed, throttle
+
+    @mock.patch('sTest.throttling.consume_tokens', return_value=(0.0, -1))
+    def test_request_takes_a_token_per_ip_and_email(self, consume_tokens):
+        allowed, _ = self.allow_request({'email': ' Student@Example.com '})
+
+        self.assertIs(allowed, True)
+        consume_tokens.assert_called_once_with([(get_bucket_key('login', 'ip', '10.0.0.1'), 30, 60),
+                                                (get_bucket_key('login', 'email', 'student@example.com'), 10, 300)])
+
+    @mock.patch('sTest.throttling.record_throttled_request')
+    @mock.patch('sTest.throttling.consume_tokens', return_value=(12.5, 1))
+    def test_empty_bucket_throttles_the_request(self, consume_tokens, record_throttled_request):
+        allowed, throttle = self.allow_request({'email': 'student@example.com'})
+
+        self.assertIs(allowed, False)
+        self.assertEqual(throttle.wait(), 12.5)
+        record_throttled_request.assert_called_once_with('login', 'email')
+
+    @mock.patch('sTest.throttling.consume_tokens', side_effect=ConnectionError)
+    def test_request_is_let_through_when_redis_is_down(self, consume_tokens):
+        allowed, _ = self.allow_request({'email': 'student@example.com'})
+        self.assertIs(allowed, True)
+
+    @mock.patch('sTest.throttling.consume_tokens')
+    def test_actions_without_limits_are_not_throttled(self, consume_tokens):
+        allowed, _ = self.allow_request({}, action='logout')
+
+        self.assertIs(allowed, True)
+        consume_tokens.assert_not_called()
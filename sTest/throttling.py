@@ -0,0 +1,119 @@
+import hashlib
+import logging
+import time
+
+from django.conf import settings
+from django_redis import get_redis_connection
+from rest_framework.throttling import BaseThrottle
+
+logger = logging.getLogger('Throttling')
+
+THROTTLED_REQUESTS_KEY = 'rate_limit_throttled'
+
+# Token buckets, KEYS[i] holding ARGV[2i] tokens refilled over ARGV[2i + 1] seconds, ARGV[1] is the current time.
+# A token is taken from every bucket or, if any of them is empty, from none. Returns the seconds to wait and
+# the index of the bucket that has to refill the longest.
+CONSUME_TOKENS_SCRIPT = """
+local now = tonumber(ARGV[1])
+local tokens = {}
+local wait = 0
+local limiting = 0
+for i, key in ipairs(KEYS) do
+    local capacity = tonumber(ARGV[2 * i])
+    local rate = capacity / tonumber(ARGV[2 * i + 1])
+    local state = redis.call('HMGET', key, 'tokens', 'updated_at')
+    local available = tonumber(state[1]) or capacity
+    local updated_at = tonumber(state[2]) or now
+    available = math.min(capacity, available + math.max(0, now - updated_at) * rate)
+    tokens[i] = available
+    if available < 1 and (1 - available) / rate > wait then
+        wait = (1 - available) / rate
+        limiting = i
+    end
+end
+if wait > 0 then
+    return {tostring(wait), limiting}
+end
+for i, key in ipairs(KEYS) do
+    redis.call('HSET', key, 'tokens', tokens[i] - 1, 'updated_at', now)
+    redis.call('EXPIRE', key, math.ceil(tonumber(ARGV[2 * i + 1])))
+end
+return {'0', 0}
+"""
+
+
+def get_bucket_key(endpoint, scope, identity):
+    digest = hashlib.sha1(str(identity).encode()).hexdigest()
+    return f'rate_limit_{endpoint}_{scope}_{digest}'
+
+
+def consume_tokens(buckets):
+    """
+    Takes a token from each of the buckets, a list of (key, capacity, period) tuples, in one round trip.
+    Returns the seconds to wait before retrying, 0 when the request is allowed, and the index of the
+    bucket that rejected it.
+    """
+    args = [time.time()]
+    for _, capacity, period in buckets:
+        args.extend([capacity, period])
+
+    wait, limiting = get_redis_connection('default').eval(
+        CONSUME_TOKENS_SCRIPT, len(buckets), *[key for key, _, _ in buckets], *args)
+    return float(wait), limiting - 1
+
+
+def record_throttled_request(endpoint, scope):
+    get_redis_connection('default').hincrby(THROTTLED_REQUESTS_KEY, f'{endpoint}:{scope}', 1)
+
+
+def get_throttled_counts():
+    """
+    Number of throttled requests per endpoint and scope, e.g. {'login:email': 12}.
+    """
+    counts = get_redis_connection('default').hgetall(THROTTLED_REQUESTS_KEY)
+    return {field.decode(): int(count) for field, count in counts.items()}
+
+
+class AuthRateThrottle(BaseThrottle):
+    """
+    Limits the unauthenticated auth endpoints with token buckets per client IP and per email, as
+    configured for the view action in AUTH_RATE_LIMITS. Lets requests through if Redis is down.
+    """
+
+    def __init__(self):
+        self.wait_seconds = None
+
+    def get_identities(self, request):
+        identities = {'ip': self.get_ident(request)}
+        email = request.data.get('email') if hasattr(request.data, 'get') else None
+        if email:
+            identities['email'] = str(email).strip().lower()
+        return identities
+
+    def allow_request(self, request, view):
+        endpoint = view.action
+        limits = settings.AUTH_RATE_LIMITS.get(endpoint)
+        if not limits:
+            return True
+
+        identities = self.get_identities(request)
+        limits = [(scope, capacity, period) for scope, capacity, period in limits if identities.get(scope)]
+        buckets = [(get_bucket_key(endpoint, scope, identities[scope]), capacity, period)
+                   for scope, capacity, period in limits]
+
+        try:
+            self.wait_seconds, limiting = consume_tokens(buckets)
+            if not self.wait_seconds:
+                return True
+
+            scope = limits[limiting][0]
+            record_throttled_request(endpoint, scope)
+        except Exception:
+            logger.exception(f'Error checking the rate limit of {endpoint}')
+            return True
+
+        logger.warning(f'Throttled {endpoint} request by {scope} {identities[scope]}')
+        return False
+
+    def wait(self):
+        return self.wait_seconds
@@ -1,9 +1,29 @@
+import hashlib
+import json
+import math
+import time
 import uuid
 
+from django.core.cache import cache
+from django.core.paginator import Paginator as DjangoPaginator
+from django.db import connections
+from django.db.models import QuerySet
+from django.utils.functional import cached_property
 from rest_framework import status
-from rest_framework.pagination import PageNumberPagination
+from rest_framework.pagination import PageNumberPagination, CursorPagination
 from rest_framework.response import Response
 
+# Counts at or above this size are cached, smaller ones are cheap enough to count on every request
+COUNT_CACHE_THRESHOLD = 1000
+# Above this planner estimate the estimate itself is returned while the exact count is computed in the background
+COUNT_ESTIMATE_THRESHOLD = 100000
+# Cached counts older than this are still served but trigger a background refresh
+COUNT_CACHE_REFRESH_AFTER = 60
+COUNT_CACHE_TIMEOUT = 60 * 60
+# Queries once counted above COUNT_ESTIMATE_THRESHOLD are remembered this long, so that after their count expires
+# they are answered from the planner estimate instead of a synchronous COUNT(*)
+LARGE_COUNT_HINT_TIMEOUT = 24 * 60 * 60
+
 
 def generate_unique_identifier(input_string):
     # Remove spaces from the input string
@@ -54,7 +74,89 @@ def get_error_response_for_serializer(logger, serializer, data):
     return Response(data=response, status=status.HTTP_400_BAD_REQUEST)
 
 
+def get_count_cache_key(queryset):
+    # Ordering does not change the count, so it is dropped to share the entry across sort orders
+    sql, params = queryset.order_by().query.sql_with_params()
+    digest = hashlib.md5(f'{sql}|{params}'.encode()).hexdigest()
+    return f'count_{queryset.model._meta.label_lower}_{digest}'
+
+
+def store_cached_count(cache_key, count):
+    cache.set(cache_key, {'count': count, 'computed_at': time.time()}, timeout=COUNT_CACHE_TIMEOUT)
+    if count >= COUNT_ESTIMATE_THRESHOLD:
+        cache.set(f'{cache_key}_large', True, timeout=LARGE_COUNT_HINT_TIMEOUT)
+
+
+def count_sql(using, sql, params):
+    with connections[using].cursor() as cursor:
+        cursor.execute(f'SELECT COUNT(*) FROM ({sql}) subquery', params)
+        return cursor.fetchone()[0]
+
+
+def schedule_count_refresh(queryset, cache_key):
+    from sTest.tasks import refresh_cached_count
+
+    # Only one refresh per key can be in flight at a time
+    if cache.add(f'{cache_key}_refreshing', True, timeout=COUNT_CACHE_REFRESH_AFTER):
+        # The worker gets the compiled SQL and its parameters, never a pickled query
+        sql, params = queryset.order_by().query.sql_with_params()
+        refresh_cached_count.delay(using=queryset.db, sql=sql, params=list(params), cache_key=cache_key)
+
+
+def estimate_count(queryset):
+    """
+    Returns the planner's row estimate for the queryset, or None if it cannot be obtained.
+    """
+    sql, params = queryset.order_by().query.sql_with_params()
+    try:
+        with connections[queryset.db].cursor() as cursor:
+            cursor.execute(f'EXPLAIN (FORMAT JSON) {sql}', params)
+            plan = cursor.fetchone()[0]
+        if isinstance(plan, str):
+            plan = json.loads(plan)
+        return int(plan[0]['Plan']['Plan Rows'])
+    except Exception:
+        return None
+
+
+def get_cached_count(queryset):
+    """
+    Returns the total count for a list queryset without running COUNT(*) on every request.
+
+    Small results are counted directly. Larger ones are cached per normalized query and refreshed in the
+    background once stale. Queries already known to be very large fall back to the planner estimate until the
+    exact count is ready, any other query is never EXPLAINed.
+    """
+    cache_key = get_count_cache_key(queryset)
+    cached = cache.get_many([cache_key, f'{cache_key}_large'])
+    if cache_key in cached:
+        if time.time() - cached[cache_key]['computed_at'] > COUNT_CACHE_REFRESH_AFTER:
+            schedule_count_refresh(queryset, cache_key)
+        return cached[cache_key]['count']
+
+    if f'{cache_key}_large' in cached:
+        estimate = estimate_count(queryset)
+        if estimate is not None:
+            schedule_count_refresh(queryset, cache_key)
+            return estimate
+
+    count = queryset.count()
+    if count >= COUNT_CACHE_THRESHOLD:
+        store_cached_count(cache_key, count)
+    return count
+
+
+class CachedCountPaginator(DjangoPaginator):
+    @cached_property
+    def count(self):
+        if isinstance(self.object_list, QuerySet):
+            return get_cached_count(self.object_list)
+        return super().count
+
+
 class CustomPageNumberPagination(PageNumberPagination):
+    django_paginator_class = CachedCountPaginator
+
     def get_paginated_response(self, data):
         return Response({
             'next': self.get_next_link(),
@@ -64,3 +166,38 @@ class CustomPageNumberPagination(PageNumberPagination):
             'current_page': self.page.number,
             'results': data
         })
+
+
+class CustomCursorPagination(CursorPagination):
+    """
+    Keyset pagination over an indexed, unique ordering, so deep pages cost the same as the first one.
+    The response keeps the envelope of CustomPageNumberPagination, without a current page number.
+    """
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.count = get_cached_count(queryset)
+        return super().paginate_queryset(queryset, request, view)
+
+    def get_paginated_response(self, data):
+        return Response({
+            'next': self.get_next_link(),
+            'previous': self.get_previous_link(),
+            'count': self.count,
+            'total_pages': math.ceil(self.count / self.page_size) if self.page_size else 1,
+            'current_page': None,
+            'results': data
+        })
+
+
+def get_paginator(request, page_size=15, ordering='-id'):
+    """
+    Returns the paginator for a list endpoint, `?pagination=cursor` opts into keyset pagination
+    ordered by `ordering`, otherwise the page number pagination is used.
+    """
+    if request.query_params.get('pagination') == 'cursor':
+        paginator = CustomCursorPagination()
+        paginator.ordering = ordering
+    else:
+        paginator = CustomPageNumberPagination()
+    paginator.page_size = page_size
+    return paginator
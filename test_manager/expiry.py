@@ -0,0 +1,35 @@
+from django.utils import timezone
+from django_redis import get_redis_connection
+
+SUBMISSION_DEADLINES_KEY = 'submission_deadlines'
+EXPIRY_BATCH_SIZE = 500
+
+# Claims up to ARGV[2] submissions due by ARGV[1], so that concurrent tickers never expire the same ones
+POP_DUE_SUBMISSIONS_SCRIPT = """
+local due = redis.call('ZRANGEBYSCORE', KEYS[1], '-inf', ARGV[1], 'LIMIT', 0, tonumber(ARGV[2]))
+if #due > 0 then
+    redis.call('ZREM', KEYS[1], unpack(due))
+end
+return due
+"""
+
+
+def schedule_submission_expiry(deadlines):
+    """
+    Adds the deadlines, a mapping of test submission id to expiration date, to the expiry schedule.
+    Rescheduling a submission replaces its previous deadline.
+    """
+    if deadlines:
+        get_redis_connection('default').zadd(SUBMISSION_DEADLINES_KEY, {
+            str(test_submission_id): expiration_date.timestamp()
+            for test_submission_id, expiration_date in deadlines.items()
+        })
+
+
+def pop_due_submissions(limit=EXPIRY_BATCH_SIZE):
+    """
+    Removes and returns the ids of up to `limit` test submissions whose deadline has passed.
+    """
+    redis = get_redis_connection('default')
+    due = redis.eval(POP_DUE_SUBMISSIONS_SCRIPT, 1, SUBMISSION_DEADLINES_KEY, timezone.now().timestamp(), limit)
+    return [int(test_submission_id) for test_submission_id in due]
@@ -0,0 +1,67 @@
+import gzip
+import json
+import time
+
+import orjson
+from django.core.management.base import BaseCommand
+from django.core.serializers.json import DjangoJSONEncoder
+from rest_framework.renderers import JSONRenderer
+from rest_framework.test import APIRequestFactory, force_authenticate
+
+from sTest.renderers import ORJSONRenderer
+from test_manager.models import TestSubmission
+from test_manager.views import ResultViewSet
+
+
+class Command(BaseCommand):
+    help = "Compare JSON rendering and gzip compression on the result reports of completed submissions"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--submissions', type=int, default=10)
+        parser.add_argument('--iterations', type=int, default=50)
+
+    def handle(self, *args, **options):
+        payloads = self.get_report_payloads(options['submissions'])
+        if not payloads:
+            self.stdout.write(self.style.WARNING('No completed submissions to benchmark.'))
+            return
+
+        renderers = [
+            ('json', lambda data: json.dumps(data, cls=DjangoJSONEncoder).encode()),
+            ('drf', JSONRenderer().render),
+            ('orjson', ORJSONRenderer().render),
+        ]
+        iterations = options['iterations']
+
+        for name, render in renderers:
+            start = time.process_time()
+            for _ in range(iterations):
+                for payload in payloads:
+                    render(payload)
+            render_time = (time.process_time() - start) * 1000 / (iterations * len(payloads))
+
+            contents = [render(payload) for payload in payloads]
+            start = time.process_time()
+            compressed_size = sum(len(gzip.compress(content, compresslevel=6)) for content in contents)
+            gzip_time = (time.process_time() - start) * 1000 / len(contents)
+
+            self.stdout.write(f'{name:<7} render {render_time:7.3f} ms  gzip {gzip_time:7.3f} ms  '
+                              f'{sum(len(content) for content in contents) // len(contents):8d} bytes  '
+                              f'{compressed_size // len(contents):8d} gzipped')
+
+    @staticmethod
+    def get_report_payloads(limit):
+        view = ResultViewSet.as_view({'get': 'get_details'})
+        factory = APIRequestFactory()
+
+        test_submissions = TestSubmission.objects.filter(
+            status=TestSubmission.COMPLETED, result__isnull=False
+        ).select_related('student').order_by('-id')[:limit]
+
+        payloads = []
+        for test_submission in test_submissions:
+            request = factory.get('/api/result/details/', {'test_submission_id': test_submission.id})
+            force_authenticate(request, user=test_submission.student)
+            response = view(request)
+            payloads.append(orjson.loads(response.content))
+        return payloads
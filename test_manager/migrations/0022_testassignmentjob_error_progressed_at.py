@@ -0,0 +1,24 @@
+# Generated by Django 4.1.10 on 2026-10-19 15:05
+
+from django.db import migrations, models
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("test_manager", "0021_testassignmentjob"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="testassignmentjob",
+            name="error",
+            field=models.TextField(blank=True, default=""),
+        ),
+        migrations.AddField(
+            model_name="testassignmentjob",
+            name="progressed_at",
+            field=models.DateTimeField(default=django.utils.timezone.now),
+        ),
+    ]
@@ -1,9 +1,12 @@
-from django.db import models
+from datetime import timedelta
+
+from django.db import models, transaction
 from django.utils import timezone
 
 from course_manager.models import Course, Subject, CourseSubjects, Question
 from notification_manager.models import Notification
-from notification_manager.utils import mark_notification_as_read
+from notification_manager.read_state import queue_mark_as_read
+from test_manager.expiry import schedule_submission_expiry
 from user_manager.models import User
 
 
@@ -147,6 +150,30 @@ class TestSubmission(models.Model):
 
         return test_submissions
 
+    @classmethod
+    def create_submissions_for_students(cls, test, student_ids):
+        """
+        Assigns the test to the students with a single INSERT, the submissions expire after 48 hours.
+        The deadlines are scheduled for expiry once the transaction commits.
+        """
+        assigned_date = timezone.now()
+        expiration_date = assigned_date + timedelta(hours=48)
+        submissions = cls.objects.bulk_create([
+            cls(test=test, student_id=student_id, assigned_date=assigned_date, expiration_date=expiration_date)
+            for student_id in student_ids
+        ])
+
+        deadlines = {submission.id: expiration_date for submission in submissions}
+        transaction.on_commit(lambda: schedule_submission_expiry(deadlines))
+        return submissions
+
+    @classmethod
+    def get_first_eligible_submission_id(cls, student):
+        # The student can only take the oldest test that is yet to start or in progress.
+        return cls.objects.filter(
+            student=student, status__in=[TestSubmission.YET_TO_START, TestSubmission.IN_PROGRESS]
+        ).order_by('assigned_date').values_list('id', flat=True).first()
+
 
 class Result(models.Model):
     correct_answer_count = models.IntegerField()
@@ -243,8 +270,8 @@ class Result(models.Model):
         if all_answered:
             test_submission.status = TestSubmission.COMPLETED
             test_submission.completion_date = timezone.now()
-            mark_notification_as_read.delay(user_id=test_submission.student.id, category=Notification.TEST,
-                                            reference_id=test_submission.id)
+            queue_mark_as_read(user_id=test_submission.student_id, category=Notification.TEST,
+                               reference_id=test_submission.id)
         else:
             test_submission.status = TestSubmission.IN_PROGRESS
 
@@ -323,3 +350,65 @@ class AnsweredQuestions(models.Model):
 
     def __str__(self):
         return f"{self.student.name} - {self.course_subject}"
+
+
+class TestAssignmentJob(models.Model):
+    """
+    Assigns a test to every student of a cohort of the test's course, optionally narrowed down by
+    faculty, mentor and subscription type. The students are assigned in chunks by Celery tasks.
+    """
+    test = models.ForeignKey(Test, on_delete=models.CASCADE, related_name='assignment_jobs')
+    created_by = models.ForeignKey(User, on_delete=models.CASCADE, related_name='test_assignment_jobs')
+    # Cohort selector, {'faculty_id': .., 'mentor_id': .., 'subscription_type': ..}
+    cohort = models.JSONField(default=dict)
+    # Identifies the test and cohort, only one job per key runs at a time
+    idempotency_key = models.CharField(max_length=64, db_index=True)
+
+    PENDING = 'PENDING'
+    RUNNING = 'RUNNING'
+    COMPLETED = 'COMPLETED'
+    FAILED = 'FAILED'
+    STATUS_CHOICES = [
+        (PENDING, 'Pending'),
+        (RUNNING, 'Running'),
+        (COMPLETED, 'Completed'),
+        (FAILED, 'Failed'),
+    ]
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default=PENDING)
+
+    total_count = models.PositiveIntegerField(default=0)
+    processed_count = models.PositiveIntegerField(default=0)
+    assigned_count = models.PositiveIntegerField(default=0)
+    # Students that already had a submission for the test when their chunk ran
+    skipped_count = models.PositiveIntegerField(default=0)
+    failed_count = models.PositiveIntegerField(default=0)
+    failures = models.JSONField(default=list)
+    # Why the job as a whole failed, e.g. the cohort could not be resolved or the job went stale
+    error = models.TextField(blank=True, default='')
+
+    created_at = models.DateTimeField(auto_now_add=True)
+    # Moved forward whenever the job makes progress, a pending or running job that stops moving is stale
+    progressed_at = models.DateTimeField(default=timezone.now)
+    completed_at = models.DateTimeField(null=True, blank=True)
+
+    STALE_AFTER = timedelta(minutes=15)
+
+    class Meta:
+        ordering = ['-created_at']
+
+    @classmethod
+    def get_job_by_id(cls, job_id):
+        return cls.objects.get(id=job_id)
+
+    @classmethod
+    def fail_stale_jobs(cls, idempotency_key):
+        now = timezone.now()
+        cls.objects.filter(idempotency_key=idempotency_key, status__in=[cls.PENDING, cls.RUNNING],
+                           progressed_at__lt=now - cls.STALE_AFTER).update(
+            status=cls.FAILED, error='The job stopped making progress.', completed_at=now)
+
+    @classmethod
+    def get_active_job(cls, idempotency_key):
+        # A stale job no longer blocks a new one for the same test and cohort
+        cls.fail_stale_jobs(idempotency_key=idempotency_key)
+        return cls.objects.filter(idempotency_key=idempotency_key, status__in=[cls.PENDING, cls.RUNNING]).first()
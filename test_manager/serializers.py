@@ -1,8 +1,9 @@
 from rest_framework import serializers
 
 from course_manager.models import CourseEnrollment
+from sTest.serializers import ValuesListSerializer
 from user_manager.models import User
-from .models import Test, Section, TestSubmission, PracticeTestResult, PracticeTest
+from .models import Test, Section, TestSubmission, PracticeTestResult, PracticeTest, TestAssignmentJob
 
 
 class SectionSerializer(serializers.ModelSerializer):
@@ -32,6 +33,39 @@ class TestListSerializer(serializers.ModelSerializer):
                   'show_prev_button', 'created_at', 'updated_at']
 
 
+class TestListValuesSerializer(ValuesListSerializer):
+    """
+    Same output as TestListSerializer, built from a single values() query.
+    """
+    fields = {
+        'id': 'id',
+        'course': 'course_id',
+        'course_name': 'course__name',
+        'name': 'name',
+        'test_type': 'test_type',
+        'format_type': 'format_type',
+        'show_skip_button': 'show_skip_button',
+        'show_prev_button': 'show_prev_button',
+        'created_at': 'created_at',
+        'updated_at': 'updated_at',
+    }
+    datetime_fields = ('created_at', 'updated_at')
+
+
+class TestAssignmentCohortSerializer(serializers.Serializer):
+    course_id = serializers.IntegerField(required=False)
+    faculty_id = serializers.IntegerField(required=False)
+    mentor_id = serializers.IntegerField(required=False)
+    subscription_type = serializers.ChoiceField(choices=CourseEnrollment.SUBSCRIPTION_TYPE_CHOICES, required=False)
+
+
+class TestAssignmentJobSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = TestAssignmentJob
+        fields = ['id', 'test', 'cohort', 'status', 'total_count', 'processed_count', 'assigned_count',
+                  'skipped_count', 'failed_count', 'failures', 'error', 'created_at', 'completed_at']
+
+
 class TestSubmissionSerializer(serializers.ModelSerializer):
     id = serializers.IntegerField(source='test.id', read_only=True)
     test_submission_id = serializers.IntegerField(source='id', read_only=True)
@@ -60,11 +94,13 @@ class TestSubmissionSerializer(serializers.ModelSerializer):
         return False
 
     def is_eligible_for_student(self, test_submission, user):
-        first_eligible_test = TestSubmission.objects.filter(
-            student=user, status__in=[TestSubmission.YET_TO_START, TestSubmission.IN_PROGRESS]
-        ).order_by('assigned_date').first()
+        # List views resolve the first eligible submission once and pass it in the context
+        if 'first_eligible_submission_id' in self.context:
+            first_eligible_submission_id = self.context['first_eligible_submission_id']
+        else:
+            first_eligible_submission_id = TestSubmission.get_first_eligible_submission_id(student=user)
 
-        return test_submission == first_eligible_test
+        return test_submission.id == first_eligible_submission_id
 
 
 class ExistingStudentListSerializer(serializers.ModelSerializer):
@@ -108,14 +144,5 @@ class EligibleStudentSerializer(serializers.ModelSerializer):
         fields = ['id', 'name', 'email', 'subscription_type']
 
     def get_subscription_type(self, obj):
-        request = self.context.get('request')
-        if request:
-            test_id = request.parser_context['kwargs'].get('pk', None)
-            if test_id:
-                test = Test.objects.filter(id=test_id).first()
-                if test:
-                    course_id = test.course_id
-                    enrollment = CourseEnrollment.objects.filter(student=obj, course_id=course_id).first()
-                    if enrollment:
-                        return enrollment.get_subscription_type_display()
-        return None
+        # Annotated by the eligible students listing from the enrollment in the test's course
+        return dict(CourseEnrollment.SUBSCRIPTION_TYPE_CHOICES).get(obj.subscription_type)
@@ -0,0 +1,142 @@
+import logging
+
+from django.db import transaction
+from django.db.models import F
+from django.utils import timezone
+
+from notification_manager.digest import queue_notification
+from notification_manager.models import NotificationTemplate, Notification
+from sTest.celery import app
+from test_manager.expiry import pop_due_submissions, schedule_submission_expiry
+from test_manager.models import Test, TestSubmission, TestAssignmentJob
+from test_manager.utils import get_cohort_students
+
+NOTIFICATION_CHUNK_SIZE = 200
+ASSIGNMENT_CHUNK_SIZE = 500
+
+logger = logging.getLogger('Test-Assignment')
+
+
+@app.task
+def send_test_assigned_notifications(test_id, test_submission_ids):
+    """
+    Notifies the students of newly assigned test submissions, loading the recipients in chunks.
+    """
+    test_name = Test.objects.values_list('name', flat=True).get(id=test_id)
+
+    for start in range(0, len(test_submission_ids), NOTIFICATION_CHUNK_SIZE):
+        chunk_ids = test_submission_ids[start:start + NOTIFICATION_CHUNK_SIZE]
+        test_submissions = TestSubmission.objects.filter(id__in=chunk_ids).values('id', 'student_id', 'student__name')
+
+        for test_submission in test_submissions:
+            notification_params = {NotificationTemplate.USER_NAME: test_submission['student__name'],
+                                   NotificationTemplate.TEST_NAME: test_name,
+                                   NotificationTemplate.REFERENCE_ID: test_submission['id']}
+
+            # Tests assigned to the same student in a row are sent as one digest
+            queue_notification(notification_name=Notification.TEST_ASSIGNED_NOTIFICATION,
+                               params=notification_params,
+                               user_id=test_submission['student_id'])
+
+
+@app.task
+def run_test_assignment_job(job_id):
+    """
+    Resolves the cohort of an assignment job and dispatches one task per chunk of students.
+    """
+    # Only the first delivery of the job starts it
+    if not TestAssignmentJob.objects.filter(id=job_id, status=TestAssignmentJob.PENDING).update(
+            status=TestAssignmentJob.RUNNING):
+        return
+
+    try:
+        job = TestAssignmentJob.objects.select_related('test').get(id=job_id)
+        student_ids = list(get_cohort_students(job.test, job.cohort).order_by('id').values_list('id', flat=True))
+
+        job.total_count = len(student_ids)
+        job.progressed_at = timezone.now()
+        if not student_ids:
+            job.status = TestAssignmentJob.COMPLETED
+            job.completed_at = timezone.now()
+        job.save(update_fields=['total_count', 'progressed_at', 'status', 'completed_at'])
+
+        for start in range(0, len(student_ids), ASSIGNMENT_CHUNK_SIZE):
+            assign_test_chunk.delay(job_id=job_id, student_ids=student_ids[start:start + ASSIGNMENT_CHUNK_SIZE])
+    except Exception as e:
+        logger.exception(f'Error running test assignment job {job_id}')
+        TestAssignmentJob.objects.filter(id=job_id).update(status=TestAssignmentJob.FAILED, error=str(e),
+                                                           completed_at=timezone.now())
+
+
+@app.task
+def assign_test_chunk(job_id, student_ids):
+    job = TestAssignmentJob.get_job_by_id(job_id)
+    assigned_count = skipped_count = failed_count = 0
+
+    try:
+        with transaction.atomic():
+            # Chunks of the same test run one at a time, so that no student is assigned twice
+            test = Test.objects.select_for_update().get(id=job.test_id)
+
+            already_assigned_ids = set(TestSubmission.objects.filter(
+                test=test, student_id__in=student_ids).values_list('student_id', flat=True))
+            new_student_ids = [student_id for student_id in student_ids if student_id not in already_assigned_ids]
+
+            test.students.add(*new_student_ids)
+            submissions = TestSubmission.create_submissions_for_students(test=test, student_ids=new_student_ids)
+
+            test_submission_ids = [submission.id for submission in submissions]
+            transaction.on_commit(lambda: send_test_assigned_notifications.delay(
+                test_id=test.id, test_submission_ids=test_submission_ids))
+
+        assigned_count = len(new_student_ids)
+        skipped_count = len(already_assigned_ids)
+    except Exception as e:
+        logger.exception(f'Error assigning test {job.test_id} to students {student_ids} for job {job_id}')
+        failed_count = len(student_ids)
+        with transaction.atomic():
+            job = TestAssignmentJob.objects.select_for_update().get(id=job_id)
+            job.failures.append({'student_ids': student_ids, 'error': str(e)})
+            job.save(update_fields=['failures'])
+
+    TestAssignmentJob.objects.filter(id=job_id).update(
+        processed_count=F('processed_count') + len(student_ids),
+        assigned_count=F('assigned_count') + assigned_count,
+        skipped_count=F('skipped_count') + skipped_count,
+        failed_count=F('failed_count') + failed_count,
+        progressed_at=timezone.now(),
+    )
+
+    # The chunk that completes the count closes the job
+    finished_jobs = TestAssignmentJob.objects.filter(id=job_id, status=TestAssignmentJob.RUNNING,
+                                                     processed_count__gte=F('total_count'))
+    finished_jobs.filter(failed_count=0).update(status=TestAssignmentJob.COMPLETED, completed_at=timezone.now())
+    finished_jobs.filter(failed_count__gt=0).update(status=TestAssignmentJob.FAILED, completed_at=timezone.now())
+
+
+@app.task
+def expire_due_submissions():
+    """
+    Expires the test submissions whose deadline has passed, in batches claimed from the expiry schedule.
+    """
+    expired_count = 0
+    while True:
+        test_submission_ids = pop_due_submissions()
+        if not test_submission_ids:
+            break
+
+        try:
+            # Completed and reassigned submissions are left as they are
+            expired_count += TestSubmission.objects.filter(
+                id__in=test_submission_ids, expiration_date__lte=timezone.now(),
+                status__in=[TestSubmission.YET_TO_START, TestSubmission.IN_PROGRESS]
+            ).update(status=TestSubmission.EXPIRED)
+        except Exception:
+            logger.exception(f'Error expiring test submissions {test_submission_ids}')
+            # Put the batch back so that the next tick retries it
+            schedule_submission_expiry({test_submission_id: timezone.now()
+                                        for test_submission_id in test_submission_ids})
+            raise
+
+    if expired_count:
+        logger.info(f'Expired {expired_count} test submissions')
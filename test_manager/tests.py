@@ -1,3 +1,184 @@
-from django.test import TestCase
+from unittest import mock
 
-# Create your tests here.
+from datetime import timedelta
+
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from rest_framework.test import APIRequestFactory, force_authenticate
+
+from course_manager.models import Course, CourseEnrollment
+from test_manager.models import Test, TestSubmission, TestAssignmentJob
+from test_manager.tasks import run_test_assignment_job, assign_test_chunk, expire_due_submissions
+from test_manager.views import TestViewSet
+from user_manager.models import Role, User
+
+LOCMEM_CACHES = {'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}}
+
+
+def create_user(role, index):
+    return User.objects.create(email=f'{role.name}{index}@example.com', phone_number=f'9{index:09d}',
+                               name=f'{role.name} {index}', role=role)
+
+
+@override_settings(CACHES=LOCMEM_CACHES)
+class TestListQueryBudgetTests(TestCase):
+    def setUp(self):
+        admin_role = Role.objects.create(name='admin', description='Admin')
+        student_role = Role.objects.create(name='student', description='Student')
+        self.admin = create_user(admin_role, 1)
+        self.student = create_user(student_role, 2)
+        self.course = Course.objects.create(name='JEE')
+
+    def assign_tests(self, count):
+        for index in range(count):
+            test = Test.objects.create(course=self.course, name=f'Test {index}', created_by=self.admin,
+                                       updated_by=self.admin)
+            TestSubmission.create_submissions_for_students(test=test, student_ids=[self.student.id])
+
+    def count_list_queries(self):
+        request = APIRequestFactory().get('/api/test/')
+        force_authenticate(request, user=self.student)
+        with CaptureQueriesContext(connection) as queries:
+            response = TestViewSet.as_view({'get': 'list'})(request)
+        self.assertEqual(response.status_code, 200)
+        return len(queries), len(response.data['results'])
+
+    def test_student_list_query_count_does_not_grow_with_page_size(self):
+        self.assign_tests(1)
+        single_row_queries, row_count = self.count_list_queries()
+        self.assertEqual(row_count, 1)
+
+        self.assign_tests(11)
+        full_page_queries, row_count = self.count_list_queries()
+        self.assertEqual(row_count, 12)
+
+        self.assertEqual(full_page_queries, single_row_queries)
+
+
+@override_settings(CACHES=LOCMEM_CACHES)
+class TestAssignmentJobTests(TestCase):
+    def setUp(self):
+        admin_role = Role.objects.create(name='admin', description='Admin')
+        student_role = Role.objects.create(name='student', description='Student')
+        self.admin = create_user(admin_role, 1)
+        course = Course.objects.create(name='JEE')
+        self.students = [create_user(student_role, index) for index in range(2, 5)]
+        for student in self.students:
+            CourseEnrollment.objects.create(student=student, course=course)
+        self.test = Test.objects.create(course=course, name='Test', created_by=self.admin, updated_by=self.admin)
+
+    def create_job(self, **kwargs):
+        return TestAssignmentJob.objects.create(test=self.test, created_by=self.admin, idempotency_key='key', **kwargs)
+
+    def test_job_assigns_every_student_of_the_cohort(self):
+        job = self.create_job()
+
+        with mock.patch.object(assign_test_chunk, 'delay', side_effect=lambda **kwargs: assign_test_chunk(**kwargs)):
+            run_test_assignment_job(job_id=job.id)
+
+        job.refresh_from_db()
+        self.assertEqual(job.status, TestAssignmentJob.COMPLETED)
+        self.assertEqual(job.assigned_count, len(self.students))
+        self.assertEqual(TestSubmission.objects.filter(test=self.test).count(), len(self.students))
+
+    def test_job_that_raises_is_marked_failed(self):
+        job = self.create_job()
+
+        with mock.patch('test_manager.tasks.get_cohort_students', side_effect=RuntimeError('cohort lookup failed')):
+            run_test_assignment_job(job_id=job.id)
+
+        job.refresh_from_db()
+        self.assertEqual(job.status, TestAssignmentJob.FAILED)
+        self.assertEqual(job.error, 'cohort lookup failed')
+        self.assertIsNotNone(job.completed_at)
+
+    def test_stale_running_job_does_not_block_a_new_one(self):
+        job = self.create_job(status=TestAssignmentJob.RUNNING,
+                              progressed_at=timezone.now() - TestAssignmentJob.STALE_AFTER * 2)
+
+        self.assertIsNone(TestAssignmentJob.get_active_job(idempotency_key='key'))
+        job.refresh_from_db()
+        self.assertEqual(job.status, TestAssignmentJob.FAILED)
+
+    def test_running_job_in_progress_stays_active(self):
+        job = self.create_job(status=TestAssignmentJob.RUNNING)
+        self.assertEqual(TestAssignmentJob.get_active_job(idempotency_key='key'), job)
+
+
+@override_settings(CACHES=LOCMEM_CACHES)
+class ExpireDueSubmissionsTests(TestCase):
+    def setUp(self):
+        admin = create_user(Role.objects.create(name='admin', description='Admin'), 1)
+        student_role = Role.objects.create(name='student', description='Student')
+        self.test = Test.objects.create(course=Course.objects.create(name='JEE'), name='Test', created_by=admin,
+                                        updated_by=admin)
+        self.students = [create_user(student_role, index) for index in range(2, 5)]
+
+    def create_submission(self, student, expiration_date, status=TestSubmission.YET_TO_START):
+        return TestSubmission.objects.create(test=self.test, student=student, status=status,
+                                             assigned_date=timezone.now(), expiration_date=expiration_date)
+
+    def test_only_due_open_submissions_are_expired(self):
+        overdue = self.create_submission(self.students[0], timezone.now() - timedelta(minutes=1))
+        completed = self.create_submission(self.students[1], timezone.now() - timedelta(minutes=1),
+                                           status=TestSubmission.COMPLETED)
+        # Claimed from a deadline that has since been extended
+        extended = self.create_submission(self.students[2], timezone.now() + timedelta(hours=1))
+
+        with mock.patch('test_manager.tasks.pop_due_submissions',
+                        side_effect=[[overdue.id, completed.id, extended.id], []]):
+            expire_due_submissions()
+
+        statuses = dict(TestSubmission.objects.values_list('id', 'status'))
+        self.assertEqual(statuses[overdue.id], TestSubmission.EXPIRED)
+        self.assertEqual(statuses[completed.id], TestSubmission.COMPLETED)
+        self.assertEqual(statuses[extended.id], TestSubmission.YET_TO_START)
+
+    def test_failed_batch_is_rescheduled(self):
+        overdue = self.create_submission(self.students[0], timezone.now() - timedelta(minutes=1))
+
+        with mock.patch('test_manager.tasks.pop_due_submissions', side_effect=[[overdue.id], []]), \
+                mock.patch.object(TestSubmission.objects, 'filter', side_effect=RuntimeError), \
+                mock.patch('test_manager.tasks.schedule_submission_expiry') as schedule_submission_expiry:
+            with self.assertRaises(RuntimeError):
+                expire_due_submissions()
+
+        self.assertEqual(list(schedule_submission_expiry.call_args.args[0]), [overdue.id])
+
+
+@override_settings(CACHES=LOCMEM_CACHES)
+class EligibleStudentsTests(TestCase):
+    def setUp(self):
+        self.admin = create_user(Role.objects.create(name='admin', description='Admin'), 1)
+        self.student_role = Role.objects.create(name='student', description='Student')
+        self.course = Course.objects.create(name='JEE')
+        self.test = Test.objects.create(course=self.course, name='Test', created_by=self.admin,
+                                        updated_by=self.admin)
+        self.student_count = 1
+
+    def enroll_students(self, count, subscription_type):
+        for _ in range(count):
+            self.student_count += 1
+            student = create_user(self.student_role, self.student_count)
+            CourseEnrollment.objects.create(student=student, course=self.course, subscription_type=subscription_type)
+
+    def list_eligible_students(self):
+        request = APIRequestFactory().get(f'/api/test/{self.test.id}/eligible-students/')
+        force_authenticate(request, user=self.admin)
+        with CaptureQueriesContext(connection) as queries:
+            response = TestViewSet.as_view({'get': 'get_eligible_students'})(request, pk=self.test.id)
+        self.assertEqual(response.status_code, 200)
+        return len(queries), response.data['results']
+
+    def test_subscription_type_comes_from_the_listing_query(self):
+        self.enroll_students(1, CourseEnrollment.PAID)
+        single_row_queries, students = self.list_eligible_students()
+        self.assertEqual([student['subscription_type'] for student in students],
+                         [dict(CourseEnrollment.SUBSCRIPTION_TYPE_CHOICES)[CourseEnrollment.PAID]])
+
+        self.enroll_students(4, CourseEnrollment.FREE)
+        full_page_queries, students = self.list_eligible_students()
+        self.assertEqual(len(students), 5)
+        self.assertEqual(full_page_queries, single_row_queries)
@@ -1,5 +1,69 @@
+import hashlib
+import json
+
+from django.db.models import Max, Count, Exists, OuterRef
+
+from test_manager.models import Test, TestSubmission
+from user_manager.models import User, Role
+
+
 def calculate_total_questions_required(course_subject):
     total_questions = 0
     for section in course_subject.metadata.get("sections", []):
         total_questions += section.get("no_of_questions", 0)
     return total_questions
+
+
+def get_test_validators(view, request, pk=None, *args, **kwargs):
+    test = Test.objects.filter(id=pk).annotate(
+        sections_updated_at=Max('section__updated_at'), section_count=Count('section')
+    ).values('updated_at', 'course__updated_at', 'sections_updated_at', 'section_count').first()
+    if test is None:
+        return None, None
+
+    last_modified = max(value for value in (test['updated_at'], test['course__updated_at'],
+                                            test['sections_updated_at']) if value is not None)
+    return f"{pk}-{last_modified.timestamp()}-{test['section_count']}", last_modified
+
+
+def get_result_validators(view, request, *args, **kwargs):
+    test_submission_id = request.GET.get('test_submission_id')
+    if not test_submission_id:
+        return None, None
+
+    # Only the result of a completed submission is final, reassigning it deletes the result
+    test_submission = TestSubmission.objects.filter(
+        id=test_submission_id, status=TestSubmission.COMPLETED
+    ).values('id', 'completion_date', 'result__id').first()
+    if test_submission is None or test_submission['result__id'] is None:
+        return None, None
+
+    completion_date = test_submission['completion_date']
+    etag = f"{test_submission['id']}-{test_submission['result__id']}"
+    if completion_date is not None:
+        etag = f'{etag}-{completion_date.timestamp()}'
+    return etag, completion_date
+
+
+def get_cohort_students(test, cohort):
+    """
+    Returns the active students of the test's course matching the cohort selector, leaving out
+    the students that already have a submission for the test.
+    """
+    enrollment_filters = {'course_enrollments__course': test.course_id}
+    if cohort.get('subscription_type'):
+        # Same filter() call as the course, so both apply to the same enrollment
+        enrollment_filters['course_enrollments__subscription_type'] = cohort['subscription_type']
+
+    students = User.objects.filter(role=Role.get_role_using_name('student'), is_active=True, **enrollment_filters)
+    if cohort.get('faculty_id'):
+        students = students.filter(student_metadata__faculty=cohort['faculty_id'])
+    if cohort.get('mentor_id'):
+        students = students.filter(student_metadata__mentor=cohort['mentor_id'])
+
+    assigned_submissions = TestSubmission.objects.filter(test=test, student=OuterRef('pk'))
+    return students.filter(~Exists(assigned_submissions))
+
+
+def get_cohort_idempotency_key(test_id, cohort):
+    return hashlib.sha256(json.dumps({'test_id': test_id, 'cohort': cohort}, sort_keys=True).encode()).hexdigest()
@@ -1,10 +1,8 @@
 import logging
 import random
-from datetime import timedelta
 
 from django.db import transaction
-from django.db.models import Q
-from django.http import JsonResponse
+from django.db.models import Q, Exists, OuterRef, F
 from django.shortcuts import get_object_or_404
 from django.utils import timezone
 from django_filters.rest_framework import DjangoFilterBackend
@@ -15,17 +13,24 @@ from rest_framework.response import Response
 
 from course_manager.filters import PracticeQuestionFilter
 from course_manager.models import Question, CourseSubjects, CombinedScore
-from notification_manager.models import NotificationTemplate, Notification
-from notification_manager.utils import send_notification, mark_notification_as_read
+from notification_manager.models import Notification
+from notification_manager.read_state import queue_mark_as_read
+from sTest.conditional import conditional_response
 from sTest.permissions import IsAdmin, IsAdminOrMentorOrFacultyOrStudentOrParent, \
     IsAdminOrMentorOrFaculty, IsStudent
-from sTest.utils import get_error_response_for_serializer, get_error_response, CustomPageNumberPagination
+from sTest.renderers import ORJSONResponse
+from sTest.utils import get_error_response_for_serializer, get_error_response, CustomPageNumberPagination, \
+    get_paginator
+from test_manager.expiry import schedule_submission_expiry
 from test_manager.filters import TestFilter
 from test_manager.models import Test, Section, TestSubmission, Result, PracticeTest, PracticeTestResult, \
-    AnsweredQuestions
+    AnsweredQuestions, TestAssignmentJob
 from test_manager.serializers import TestSerializer, TestListSerializer, ExistingStudentListSerializer, \
-    TestSubmissionSerializer, PracticeTestListSerializer, EligibleStudentSerializer, SectionSerializer
-from test_manager.utils import calculate_total_questions_required
+    TestSubmissionSerializer, PracticeTestListSerializer, EligibleStudentSerializer, SectionSerializer, \
+    TestListValuesSerializer, TestAssignmentCohortSerializer, TestAssignmentJobSerializer
+from test_manager.tasks import send_test_assigned_notifications, run_test_assignment_job
+from test_manager.utils import calculate_total_questions_required, get_test_validators, get_result_validators, \
+    get_cohort_idempotency_key
 from user_manager.models import User, Role, StudentMetadata
 
 
@@ -65,19 +70,25 @@ class TestViewSet(viewsets.ModelViewSet):
         user = request.user
         serializer_class = TestListSerializer
         queryset = None
+        serializer_context = {'user': user}
+        ordering = '-id'
 
         if user.role.name in ['admin', 'faculty', 'mentor']:
             # Fetch Tests for admin, faculty, and mentor.
-            queryset = Test.get_all()
+            queryset = Test.get_all().select_related('course')
             serializer_class = TestListSerializer
         elif user.role.name in ['student', 'parent']:
             # Fetch TestSubmissions for students and parents.
             if user.role.name == 'student':
                 queryset = TestSubmission.objects.filter(student=user)
+                serializer_context['first_eligible_submission_id'] = \
+                    TestSubmission.get_first_eligible_submission_id(student=user)
             elif user.role.name == 'parent':
                 sm = StudentMetadata.objects.filter(Q(father=user) | Q(mother=user))
                 queryset = TestSubmission.objects.filter(student__in=sm.values_list('student', flat=True))
+            queryset = queryset.select_related('test', 'test__course', 'student')
             serializer_class = TestSubmissionSerializer
+            ordering = 'id'
 
         # Apply dynamic filtering
         filter_backends = [DjangoFilterBackend]
@@ -88,15 +99,22 @@ class TestViewSet(viewsets.ModelViewSet):
         filtered_tests = filterset.qs
 
         # Apply pagination
-        paginator = CustomPageNumberPagination()
-        paginator.page_size = 15
+        paginator = get_paginator(request, ordering=ordering)
+
+        if serializer_class is TestListSerializer:
+            # Plain test rows are served from values(), honouring ?fields= and ?omit=
+            values_serializer = TestListValuesSerializer(request)
+            paginated_tests = paginator.paginate_queryset(values_serializer.get_queryset(filtered_tests), request)
+            return paginator.get_paginated_response(values_serializer.to_representation(paginated_tests))
+
         paginated_objects = paginator.paginate_queryset(filtered_tests, request)
 
-        serializer = serializer_class(paginated_objects, many=True, context={'user': user})
+        serializer = serializer_class(paginated_objects, many=True, context=serializer_context)
 
         return paginator.get_paginated_response(serializer.data)
 
     @permission_classes([IsAdminOrMentorOrFacultyOrStudentOrParent])
+    @conditional_response(get_test_validators)
     def retrieve(self, request, pk=None, *args, **kwargs):
         test = Test.get_test_by_id(test_id=pk)
         serializer = TestSerializer(test)
@@ -177,8 +195,7 @@ class TestViewSet(viewsets.ModelViewSet):
             test_submissions = []
 
         # Apply pagination
-        paginator = CustomPageNumberPagination()
-        paginator.page_size = 15
+        paginator = get_paginator(request, ordering='id')
         paginated_tests = paginator.paginate_queryset(test_submissions, request)
 
         serializer = ExistingStudentListSerializer(paginated_tests, many=True)
@@ -189,14 +206,13 @@ class TestViewSet(viewsets.ModelViewSet):
     @action(detail=True, methods=['GET'], permission_classes=[IsAdmin], url_path='eligible-students')
     def get_eligible_students(self, request, pk=None, *args, **kwargs):
         test = Test.get_test_by_id(test_id=pk)
-        course = test.course
-        test_students = TestSubmission.get_students_assigned_to_test_with_status(test=test)
+        assigned_submissions = TestSubmission.get_students_assigned_to_test_with_status(test=test).filter(
+            student=OuterRef('pk'))
 
-        # Start with all students excluding those already assigned to the test
-        query = Q(course_enrollments__course=course, is_active=True)
-        query = query & ~Q(id__in=test_students.values_list('student', flat=True))
+        # Start with all students enrolled in the course, excluding those already assigned to the test
+        query = Q(course_enrollments__course=test.course_id, is_active=True) & ~Exists(assigned_submissions)
 
-        # Apply filters if present in query parameters
+        # Apply filters if present in query parameters, these are backed by the trigram indexes on User
         name = request.query_params.get('name')
         email = request.query_params.get('email')
 
@@ -205,15 +221,16 @@ class TestViewSet(viewsets.ModelViewSet):
         if email:
             query = query & Q(email__icontains=email)
 
-        students = User.objects.filter(query)
+        # Annotating after the filter reuses the enrollment join, so the subscription type of the
+        # test's course comes back with each student instead of being fetched per row
+        students = User.objects.filter(query).annotate(subscription_type=F('course_enrollments__subscription_type'))
 
         # Apply pagination
         paginator = CustomPageNumberPagination()
         paginator.page_size = 15
         paginated_students = paginator.paginate_queryset(students, request)
 
-        # Pass request context to the serializer to access the request data
-        serializer = EligibleStudentSerializer(paginated_students, many=True, context={'request': request})
+        serializer = EligibleStudentSerializer(paginated_students, many=True)
 
         # Return the paginated response
         return paginator.get_paginated_response(serializer.data)
@@ -234,33 +251,49 @@ class TestViewSet(viewsets.ModelViewSet):
         # Add students to the test
         test.students.add(*student_ids)
 
-        # Create TestSubmission entry for each student
-        assigned_date = timezone.now()
-        expiration_date = assigned_date + timedelta(hours=48)
+        # Create the TestSubmission entries in one statement
+        submissions = TestSubmission.create_submissions_for_students(test=test, student_ids=student_ids)
 
-        submissions = []
-        for student_id in student_ids:
-            test_submission = TestSubmission.objects.create(
-                test=test,
-                student_id=student_id,
-                assigned_date=assigned_date,
-                expiration_date=expiration_date
-            )
-            submissions.append(test_submission)
+        # Notify the students once the submissions are committed, in a single task
+        test_submission_ids = [submission.id for submission in submissions]
+        transaction.on_commit(lambda: send_test_assigned_notifications.delay(test_id=test.id,
+                                                                             test_submission_ids=test_submission_ids))
 
-            # Send notification
-            student = User.get_user_by_id(student_id)
-            notification_params = {NotificationTemplate.USER_NAME: student.name,
-                                   NotificationTemplate.TEST_NAME: test.name,
-                                   NotificationTemplate.REFERENCE_ID: test_submission.id}
+        return Response(data={"detail": "Students added successfully."}, status=status.HTTP_200_OK)
 
-            send_notification.delay(notification_name=Notification.TEST_ASSIGNED_NOTIFICATION,
-                                    params=notification_params,
-                                    user_id=student.id)
+    @action(detail=True, methods=['POST'], permission_classes=[IsAdmin], url_path='assignment-jobs')
+    def create_assignment_job(self, request, pk=None, *args, **kwargs):
+        test = Test.get_test_by_id(test_id=pk)
+        serializer = TestAssignmentCohortSerializer(data=request.data)
+        try:
+            serializer.is_valid(raise_exception=True)
+        except Exception as e:
+            return get_error_response_for_serializer(logger=self.logger, serializer=serializer, data=request.data)
 
-        # TestSubmission.objects.bulk_create(submissions)
+        cohort = dict(serializer.validated_data)
+        course_id = cohort.pop('course_id', None)
+        if course_id is not None and course_id != test.course_id:
+            return get_error_response('The cohort must belong to the course of the test.')
 
-        return Response(data={"detail": "Students added successfully."}, status=status.HTTP_200_OK)
+        idempotency_key = get_cohort_idempotency_key(test_id=test.id, cohort=cohort)
+        with transaction.atomic():
+            # Lock the test so that concurrent requests for the same cohort create a single job
+            Test.objects.select_for_update().get(id=test.id)
+
+            job = TestAssignmentJob.get_active_job(idempotency_key=idempotency_key)
+            if job is not None:
+                return Response(data=TestAssignmentJobSerializer(job).data, status=status.HTTP_200_OK)
+
+            job = TestAssignmentJob.objects.create(test=test, created_by=request.user, cohort=cohort,
+                                                   idempotency_key=idempotency_key)
+            transaction.on_commit(lambda: run_test_assignment_job.delay(job_id=job.id))
+
+        return Response(data=TestAssignmentJobSerializer(job).data, status=status.HTTP_202_ACCEPTED)
+
+    @action(detail=False, methods=['GET'], permission_classes=[IsAdmin], url_path='assignment-jobs/(?P<job_id>\d+)')
+    def get_assignment_job(self, request, job_id=None, *args, **kwargs):
+        job = get_object_or_404(TestAssignmentJob, id=job_id)
+        return Response(data=TestAssignmentJobSerializer(job).data, status=status.HTTP_200_OK)
 
     @action(detail=True, methods=['POST'], url_path='take-test')
     def take_test(self, request, pk=None, *args, **kwargs):
@@ -401,8 +434,8 @@ class TestViewSet(viewsets.ModelViewSet):
             test_submission.status = TestSubmission.COMPLETED
             test_submission.completion_date = timezone.now()
             test_submission.save()
-            mark_notification_as_read.delay(user_id=test_submission.student.id, category=Notification.TEST,
-                                            reference_id=test_submission.id)
+            queue_mark_as_read(user_id=test_submission.student_id, category=Notification.TEST,
+                               reference_id=test_submission.id)
 
         return Response({"detail": "Section marked as completed."}, status=status.HTTP_200_OK)
 
@@ -678,6 +711,8 @@ class TestViewSet(viewsets.ModelViewSet):
             test_submission.expiration_date = timezone.now() + timezone.timedelta(hours=48)
             test_submission.status = TestSubmission.YET_TO_START
             test_submission.save()
+            transaction.on_commit(lambda: schedule_submission_expiry(
+                {test_submission.id: test_submission.expiration_date}))
 
             # Delete any existing result associated with this test submission
             Result.objects.filter(test_submission=test_submission).delete()
@@ -694,6 +729,7 @@ class ResultViewSet(viewsets.ModelViewSet):
     logger = logging.getLogger('Results')
 
     @action(detail=False, methods=['GET'], permission_classes=[IsAuthenticated], url_path='details')
+    @conditional_response(get_result_validators)
     def get_details(self, request, *args, **kwargs):
         test_submission_id = request.GET.get('test_submission_id')
         test_submission = get_object_or_404(TestSubmission, id=test_submission_id)
@@ -841,7 +877,7 @@ class ResultViewSet(viewsets.ModelViewSet):
             response_data['subjects'].append(subject_data)
 
         response_data['total_score'] = total_score
-        return JsonResponse(response_data)
+        return ORJSONResponse(response_data)
 
 
 class PracticeTestViewSet(viewsets.ModelViewSet):
@@ -1059,4 +1095,4 @@ class PracticeTestViewSet(viewsets.ModelViewSet):
             'questions_data': questions_data
         }
 
-        return JsonResponse(section_data)
+        return ORJSONResponse(section_data)
@@ -0,0 +1,24 @@
+# Generated by Django 4.1.10 on 2026-10-19 11:40
+
+import django.contrib.postgres.indexes
+import django.db.models.functions.text
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("user_manager", "0019_user_trigram_indexes"),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="user",
+            index=django.contrib.postgres.indexes.GinIndex(
+                django.contrib.postgres.indexes.OpClass(
+                    django.db.models.functions.text.Upper("phone_number"), name="gin_trgm_ops"
+                ),
+                name="user_phone_upper_trgm_idx",
+            ),
+        ),
+    ]
@@ -1,8 +1,10 @@
 import uuid
 
 from django.contrib.auth.models import AbstractBaseUser, BaseUserManager, PermissionsMixin
+from django.contrib.postgres.indexes import GinIndex, OpClass
 from django.core.validators import RegexValidator
 from django.db import models
+from django.db.models.functions import Upper
 from django.utils import timezone
 
 phone_regex = RegexValidator(regex=r'^\d{10}$',
@@ -15,6 +17,10 @@ class Role(models.Model):
     create_date = models.DateTimeField(auto_now_add=True)
     last_updated_date = models.DateTimeField(auto_now=True)
 
+    # In-process table of roles keyed by name, roles are created once by `create_roles` and looked up on
+    # almost every request
+    _role_table = None
+
     def __str__(self):
         return self.name
 
@@ -26,9 +32,26 @@ class Role(models.Model):
     def get_roles_excluding(cls, name):
         return cls.objects.exclude(name=name)
 
+    @classmethod
+    def get_role_table(cls):
+        if cls._role_table is None:
+            cls._role_table = {role.name: role for role in cls.objects.all()}
+        return cls._role_table
+
+    @classmethod
+    def clear_role_table(cls):
+        cls._role_table = None
+
     @classmethod
     def get_role_using_name(cls, name):
-        return cls.objects.get(name=name)
+        role = cls.get_role_table().get(name)
+        # Fall back to the database, which raises DoesNotExist for unknown roles
+        return role if role is not None else cls.objects.get(name=name)
+
+    @classmethod
+    def get_role_by_id(cls, role_id):
+        role = next((role for role in cls.get_role_table().values() if role.id == role_id), None)
+        return role if role is not None else cls.objects.get(id=role_id)
 
 
 class UserManager(BaseUserManager):
@@ -71,6 +94,13 @@ class User(AbstractBaseUser, PermissionsMixin):
 
     class Meta:
         ordering = ['-created_at']
+        indexes = [
+            # Trigram indexes on UPPER(...) so that the icontains lookups used by the user filters,
+            # the eligible student search and the typeahead can be answered without a full scan.
+            GinIndex(OpClass(Upper('name'), name='gin_trgm_ops'), name='user_name_upper_trgm_idx'),
+            GinIndex(OpClass(Upper('email'), name='gin_trgm_ops'), name='user_email_upper_trgm_idx'),
+            GinIndex(OpClass(Upper('phone_number'), name='gin_trgm_ops'), name='user_phone_upper_trgm_idx'),
+        ]
 
     def __str__(self):
         return self.email
@@ -0,0 +1,31 @@
+from django.contrib.postgres.search import TrigramWordSimilarity
+from django.db.models import Case, IntegerField, Q, Value, When
+from django.db.models.functions import Greatest, Upper
+
+TYPEAHEAD_DEFAULT_LIMIT = 10
+TYPEAHEAD_MAX_LIMIT = 25
+
+
+def search_users(queryset, query):
+    """
+    Typeahead search over name, email and phone number.
+
+    Substring matches and trigram word similarity on the name (for typos) are both answered by the
+    trigram indexes on UPPER(...) of those columns. Prefix matches rank first, then the closest names.
+    """
+    term = query.upper()
+    return queryset.alias(
+        name_upper=Upper('name'),
+        email_upper=Upper('email'),
+    ).filter(
+        Q(name__icontains=query) | Q(email__icontains=query) | Q(phone_number__icontains=query) |
+        Q(name_upper__trigram_word_similar=term)
+    ).annotate(
+        is_prefix_match=Case(
+            When(Q(name__istartswith=query) | Q(email__istartswith=query) | Q(phone_number__startswith=query),
+                 then=Value(1)),
+            default=Value(0),
+            output_field=IntegerField()
+        ),
+        similarity=Greatest(TrigramWordSimilarity(term, 'name_upper'), TrigramWordSimilarity(term, 'email_upper'))
+    ).order_by('-is_prefix_match', '-similarity', 'name', 'id')
@@ -2,9 +2,10 @@ import datetime
 
 from dateutil.relativedelta import relativedelta
 from django.db import transaction
+from django.db.models import Prefetch
 from rest_framework import serializers
 
-from course_manager.models import Course, CourseEnrollment
+from course_manager.models import Course, CourseEnrollment, CourseSubjects
 from course_manager.serializers import CourseEnrollmentSerializer, CourseEnrollmentUpdateSerializer
 from .models import User, Role, TempUser, StudentMetadata
 from .utils import generate_secure_password, send_password_reset_link
@@ -29,9 +30,25 @@ class UserSerializer(serializers.ModelSerializer):
         read_only_fields = ('created_at', 'updated_at', 'is_active')
         extra_kwargs = {'password': {'write_only': True, 'required': False}}
 
+    @staticmethod
+    def setup_eager_loading(queryset):
+        """
+        Load everything the serializer touches for a page of users in a fixed number of queries.
+        """
+        return queryset.select_related('role').prefetch_related(
+            Prefetch('student_metadata',
+                     queryset=StudentMetadata.objects.select_related('father__role', 'mother__role',
+                                                                     'faculty__role', 'mentor__role')),
+            Prefetch('course_enrollments',
+                     queryset=CourseEnrollment.objects.select_related('course').prefetch_related(
+                         Prefetch('course__coursesubjects_set',
+                                  queryset=CourseSubjects.objects.select_related('subject'))))
+        )
+
     def get_course_details(self, obj):
         if obj.role.name == 'student':
-            course_enrollments = CourseEnrollment.objects.filter(student=obj)
+            # Uses the prefetched enrollments when the queryset was eager loaded
+            course_enrollments = obj.course_enrollments.all()
             return CourseEnrollmentSerializer(course_enrollments, many=True).data if course_enrollments else None
         return None
 
@@ -39,7 +56,12 @@ class UserSerializer(serializers.ModelSerializer):
         return obj.role.name.replace('_', ' ').capitalize()
 
     def _get_student_metadata(self, student):
-        return StudentMetadata.objects.filter(student=student).first()
+        # The reverse one-to-one accessor caches its result (including a missing row) on the instance,
+        # so parent, faculty and mentor details share a single lookup per student
+        try:
+            return student.student_metadata
+        except StudentMetadata.DoesNotExist:
+            return None
 
     def get_parent_details(self, obj):
         if obj.role.name == 'student':
@@ -240,6 +262,60 @@ class ApproveStudentSubscriptionSerializer(serializers.Serializer):
         return data
 
 
+class TempUserApprovalSerializer(serializers.Serializer):
+    student = serializers.IntegerField(required=True)
+    # Overrides the course plan, faculty and mentor shared by the batch
+    courses = CourseSubscriptionSerializer(many=True, required=False)
+    faculty = serializers.IntegerField(required=False)
+    mentor = serializers.IntegerField(required=False)
+
+    father_id = serializers.IntegerField(required=False)
+    father_email = serializers.EmailField(required=False)
+    father_phone_number = serializers.CharField(max_length=10, required=False)
+    father_name = serializers.CharField(max_length=30, required=False)
+
+    mother_id = serializers.IntegerField(required=False)
+    mother_email = serializers.EmailField(required=False)
+    mother_phone_number = serializers.CharField(max_length=10, required=False)
+    mother_name = serializers.CharField(max_length=30, required=False)
+
+    def validate(self, data):
+        parent_fields = ['father_id', 'father_email', 'mother_id', 'mother_email']
+        if not any(field in data for field in parent_fields):
+            raise serializers.ValidationError(
+                {"parent": "At least one of father or mother details are required for a temporary user."})
+        for parent_type in ['father', 'mother']:
+            if f'{parent_type}_email' in data:
+                for field in ['phone_number', 'name']:
+                    full_field_name = f'{parent_type}_{field}'
+                    if full_field_name not in data:
+                        raise serializers.ValidationError(
+                            {full_field_name: f"{full_field_name} is required for a temporary user."})
+        return data
+
+
+class BatchApproveTempUsersSerializer(serializers.Serializer):
+    MAX_BATCH_SIZE = 500
+
+    students = TempUserApprovalSerializer(many=True, allow_empty=False)
+    courses = CourseSubscriptionSerializer(many=True, required=False)
+    faculty = serializers.IntegerField(required=False)
+    mentor = serializers.IntegerField(required=False)
+
+    def validate_students(self, students):
+        if len(students) > self.MAX_BATCH_SIZE:
+            raise serializers.ValidationError(f"At most {self.MAX_BATCH_SIZE} students can be approved at once.")
+        temp_user_ids = [student['student'] for student in students]
+        if len(set(temp_user_ids)) != len(temp_user_ids):
+            raise serializers.ValidationError("A student appears more than once.")
+        return students
+
+    def validate(self, data):
+        if 'courses' not in data and any('courses' not in student for student in data['students']):
+            raise serializers.ValidationError({"courses": "Courses are required for every student."})
+        return data
+
+
 class ChangePasswordSerializer(serializers.Serializer):
     old_password = serializers.CharField(required=True)
     new_password = serializers.CharField(required=True)
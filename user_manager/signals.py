@@ -0,0 +1,45 @@
+from django.contrib.auth.signals import user_logged_out
+from django.db.models import Q
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
+
+from course_manager.models import CourseEnrollment
+from sTest.authentication import bump_user_version, clear_auth_context
+from .models import User, Role, StudentMetadata
+
+
+@receiver([post_save, post_delete], sender=User)
+def invalidate_auth_context_for_user(sender, instance, **kwargs):
+    bump_user_version(instance.id)
+
+    update_fields = kwargs.get('update_fields')
+    if update_fields is not None and set(update_fields) == {'last_login'}:
+        return
+
+    # The user details of a student embed their parents, faculty and mentor
+    student_ids = StudentMetadata.objects.filter(
+        Q(father=instance.id) | Q(mother=instance.id) | Q(faculty=instance.id) | Q(mentor=instance.id)
+    ).values_list('student_id', flat=True)
+    for student_id in student_ids:
+        bump_user_version(student_id)
+
+
+@receiver([post_save, post_delete], sender=StudentMetadata)
+def invalidate_auth_context_for_student_metadata(sender, instance, **kwargs):
+    bump_user_version(instance.student_id)
+
+
+@receiver([post_save, post_delete], sender=CourseEnrollment)
+def invalidate_user_version_for_course_enrollment(sender, instance, **kwargs):
+    bump_user_version(instance.student_id)
+
+
+@receiver([post_save, post_delete], sender=Role)
+def invalidate_role_table(sender, instance, **kwargs):
+    Role.clear_role_table()
+
+
+@receiver(user_logged_out)
+def clear_auth_context_on_logout(sender, request, user, **kwargs):
+    if request.session.session_key:
+        clear_auth_context(request.session.session_key)
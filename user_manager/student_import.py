@@ -0,0 +1,275 @@
+import datetime
+import logging
+
+import pandas as pd
+from dateutil.relativedelta import relativedelta
+from django.core.exceptions import ValidationError
+from django.core.validators import validate_email
+from django.db import transaction
+
+from course_manager.models import Course, CourseEnrollment
+from .models import User, Role, StudentMetadata, phone_regex
+from .tasks import complete_user_onboarding
+
+logger = logging.getLogger('Student-Import')
+
+IMPORT_CHUNK_SIZE = 200
+ONBOARDING_CHUNK_SIZE = 50
+
+PARENT_TYPES = ['father', 'mother']
+REQUIRED_COLUMNS = ['name', 'email', 'phone_number', 'courses']
+OPTIONAL_COLUMNS = ['subscription_type', 'subscription_start_date', 'subscription_end_date', 'faculty_email',
+                    'mentor_email', 'father_name', 'father_email', 'father_phone_number', 'mother_name',
+                    'mother_email', 'mother_phone_number']
+EMAIL_COLUMNS = ['email', 'faculty_email', 'mentor_email', 'father_email', 'mother_email']
+
+
+def read_student_import_file(file):
+    """
+    Reads an uploaded CSV or XLSX file into a DataFrame of stripped strings with all the import columns.
+    Courses are comma separated names and dates are YYYY-MM-DD.
+    """
+    file_name = file.name.lower()
+    if file_name.endswith('.csv'):
+        students = pd.read_csv(file, dtype=str, keep_default_na=False)
+    elif file_name.endswith('.xlsx'):
+        students = pd.read_excel(file, dtype=str, keep_default_na=False)
+    else:
+        raise ValueError('Only CSV and XLSX files are supported.')
+
+    students.columns = [str(column).strip().lower() for column in students.columns]
+    missing_columns = [column for column in REQUIRED_COLUMNS if column not in students.columns]
+    if missing_columns:
+        raise ValueError(f'Missing columns: {", ".join(missing_columns)}.')
+
+    for column in OPTIONAL_COLUMNS:
+        if column not in students.columns:
+            students[column] = ''
+    students = students[REQUIRED_COLUMNS + OPTIONAL_COLUMNS].fillna('').astype(str).apply(lambda c: c.str.strip())
+    for column in EMAIL_COLUMNS:
+        students[column] = students[column].str.lower()
+    return students
+
+
+def build_onboarding_user(**kwargs):
+    # The password is hashed by complete_user_onboarding, the user cannot log in until then
+    user = User(change_password=True, **kwargs)
+    user.set_unusable_password()
+    return user
+
+
+def schedule_user_onboarding(user_ids):
+    for start in range(0, len(user_ids), ONBOARDING_CHUNK_SIZE):
+        complete_user_onboarding.delay(user_ids=user_ids[start:start + ONBOARDING_CHUNK_SIZE])
+
+
+def parse_date(value, default):
+    # Spreadsheet cells come as 'YYYY-MM-DD 00:00:00', raises ValueError for anything that is not a date
+    return datetime.date.fromisoformat(value[:10]) if value else default
+
+
+class StudentImport:
+    """
+    Onboards a file of students. `validate` checks every row up front against in-memory maps of the courses,
+    faculty, mentors and existing users, `run` creates the valid rows in chunked transactions. Password
+    hashing and the reset-link emails are left to `complete_user_onboarding`.
+    """
+
+    def __init__(self, students):
+        self.students = students
+        self.rows = []
+        self.errors = []
+        # Parents to create keyed by email, shared by siblings, and the ids of the existing or created ones
+        self.new_parents = {}
+        self.parent_ids = {}
+        self.created_count = 0
+        self.existing_users = {}
+        self.existing_phone_numbers = set()
+        self.student_emails = set()
+        self.student_phone_numbers = set()
+
+    def add_error(self, row_number, email, errors):
+        self.errors.append({'row': row_number, 'email': email, 'errors': errors})
+
+    def validate(self):
+        students = self.students
+        course_ids = dict(Course.get_all().values_list('name', 'id'))
+        staff_ids = {(email, role_name): user_id for email, role_name, user_id in User.objects.filter(
+            role__name__in=['faculty', 'mentor'], is_active=True).values_list('email', 'role__name', 'id')}
+
+        emails = set(students['email']) | set(students['father_email']) | set(students['mother_email'])
+        phone_numbers = set(students['phone_number']) | set(students['father_phone_number']) | \
+            set(students['mother_phone_number'])
+        self.existing_users = {email: (user_id, role_name) for email, user_id, role_name in User.objects.filter(
+            email__in=emails - {''}).values_list('email', 'id', 'role__name')}
+        self.existing_phone_numbers = set(User.objects.filter(
+            phone_number__in=phone_numbers - {''}).values_list('phone_number', flat=True))
+
+        self.student_emails = set(students['email'])
+        self.student_phone_numbers = set(students['phone_number'])
+        duplicate_emails = set(students.loc[students['email'].duplicated(), 'email'])
+        duplicate_phone_numbers = set(students.loc[students['phone_number'].duplicated(), 'phone_number'])
+        today = datetime.date.today()
+
+        for index, student in enumerate(students.to_dict('records')):
+            # Row 1 is the header
+            row_number = index + 2
+            email = student['email']
+            errors = []
+
+            if not student['name'] or len(student['name']) > 30:
+                errors.append('Name is required and can have up to 30 characters.')
+            errors.extend(self.validate_contact(email, student['phone_number']))
+            if email in duplicate_emails:
+                errors.append('Email appears more than once in the file.')
+            if student['phone_number'] in duplicate_phone_numbers:
+                errors.append('Phone number appears more than once in the file.')
+
+            course_names = [name.strip() for name in student['courses'].split(',') if name.strip()]
+            unknown_courses = [name for name in course_names if name not in course_ids]
+            if unknown_courses:
+                errors.append(f'Unknown courses: {", ".join(unknown_courses)}.')
+
+            subscription_type = student['subscription_type'].upper() or CourseEnrollment.FREE
+            if subscription_type not in [CourseEnrollment.FREE, CourseEnrollment.PAID]:
+                errors.append('Subscription type must be FREE or PAID.')
+
+            try:
+                start_date = parse_date(student['subscription_start_date'], default=today)
+                end_date = parse_date(student['subscription_end_date'], default=start_date + relativedelta(months=+4))
+                if end_date < start_date:
+                    errors.append('Subscription end date is before the start date.')
+            except ValueError:
+                errors.append('Subscription dates must be in the format YYYY-MM-DD.')
+
+            staff = {}
+            for role_name in ['faculty', 'mentor']:
+                staff_email = student[f'{role_name}_email']
+                staff[role_name] = staff_ids.get((staff_email, role_name))
+                if staff_email and staff[role_name] is None:
+                    errors.append(f'No {role_name} with the email {staff_email}.')
+
+            parent_emails = {}
+            for parent_type in PARENT_TYPES:
+                parent_email = student[f'{parent_type}_email']
+                if parent_email:
+                    parent_emails[parent_type] = parent_email
+                    errors.extend(self.validate_parent(parent_type, student))
+
+            if errors:
+                self.add_error(row_number, email, errors)
+                continue
+
+            self.rows.append({
+                'row': row_number,
+                'name': student['name'],
+                'email': email,
+                'phone_number': student['phone_number'],
+                'course_ids': [course_ids[name] for name in course_names],
+                'subscription_type': subscription_type,
+                'subscription_start_date': start_date,
+                'subscription_end_date': end_date,
+                'faculty_id': staff['faculty'],
+                'mentor_id': staff['mentor'],
+                'parent_emails': parent_emails,
+            })
+
+    def validate_contact(self, email, phone_number):
+        errors = []
+        try:
+            validate_email(email)
+        except ValidationError:
+            errors.append(f'Invalid email {email}.')
+        if email in self.existing_users:
+            errors.append(f'A user with the email {email} already exists.')
+        try:
+            phone_regex(phone_number)
+        except ValidationError:
+            errors.append(f'Invalid phone number {phone_number}.')
+        if phone_number in self.existing_phone_numbers:
+            errors.append(f'A user with the phone number {phone_number} already exists.')
+        return errors
+
+    def validate_parent(self, parent_type, student):
+        parent_email = student[f'{parent_type}_email']
+        label = str.capitalize(parent_type)
+
+        if parent_email in self.student_emails:
+            return [f'{label} - email belongs to a student in the file.']
+        if parent_email in self.existing_users:
+            parent_id, role_name = self.existing_users[parent_email]
+            if role_name != 'parent':
+                return [f'{label} - {parent_email} is not a parent.']
+            self.parent_ids[parent_email] = parent_id
+            return []
+        if parent_email in self.new_parents:
+            # A sibling already brought this parent
+            return []
+
+        parent_name = student[f'{parent_type}_name']
+        parent_phone_number = student[f'{parent_type}_phone_number']
+        errors = [f'{label} - {error}' for error in self.validate_contact(parent_email, parent_phone_number)]
+        if parent_phone_number in self.student_phone_numbers:
+            errors.append(f'{label} - phone number belongs to a student in the file.')
+        if not parent_name or len(parent_name) > 30:
+            errors.append(f'{label} - name is required and can have up to 30 characters.')
+        if not errors:
+            self.new_parents[parent_email] = {'name': parent_name, 'phone_number': parent_phone_number}
+        return errors
+
+    def run(self):
+        student_role = Role.get_role_using_name('student')
+        parent_role = Role.get_role_using_name('parent')
+
+        for start in range(0, len(self.rows), IMPORT_CHUNK_SIZE):
+            chunk = self.rows[start:start + IMPORT_CHUNK_SIZE]
+            try:
+                with transaction.atomic():
+                    parent_emails = list(dict.fromkeys(
+                        parent_email for row in chunk for parent_email in row['parent_emails'].values()
+                        if parent_email not in self.parent_ids))
+                    parents = User.objects.bulk_create([
+                        build_onboarding_user(email=parent_email, role=parent_role, **self.new_parents[parent_email])
+                        for parent_email in parent_emails
+                    ])
+                    chunk_parent_ids = {**self.parent_ids, **{parent.email: parent.id for parent in parents}}
+
+                    students = User.objects.bulk_create([
+                        build_onboarding_user(email=row['email'], name=row['name'],
+                                              phone_number=row['phone_number'], role=student_role)
+                        for row in chunk
+                    ])
+
+                    StudentMetadata.objects.bulk_create([
+                        StudentMetadata(student=student, faculty_id=row['faculty_id'], mentor_id=row['mentor_id'],
+                                        father_id=chunk_parent_ids.get(row['parent_emails'].get('father')),
+                                        mother_id=chunk_parent_ids.get(row['parent_emails'].get('mother')))
+                        for student, row in zip(students, chunk)
+                    ])
+                    CourseEnrollment.objects.bulk_create([
+                        CourseEnrollment(student=student, course_id=course_id,
+                                         subscription_start_date=row['subscription_start_date'],
+                                         subscription_end_date=row['subscription_end_date'],
+                                         subscription_type=row['subscription_type'])
+                        for student, row in zip(students, chunk)
+                        for course_id in row['course_ids']
+                    ])
+
+                    user_ids = [user.id for user in parents + students]
+                    transaction.on_commit(lambda user_ids=user_ids: schedule_user_onboarding(user_ids))
+            except Exception as e:
+                logger.exception(f'Error importing rows {chunk[0]["row"]} to {chunk[-1]["row"]}')
+                for row in chunk:
+                    self.add_error(row['row'], row['email'], [str(e)])
+                continue
+
+            self.parent_ids = chunk_parent_ids
+            self.created_count += len(chunk)
+
+    def get_report(self):
+        return {
+            'total_count': len(self.students),
+            'created_count': self.created_count,
+            'failed_count': len(self.errors),
+            'errors': sorted(self.errors, key=lambda error: error['row']),
+        }
@@ -1,27 +1,79 @@
 from django.utils import timezone
 
+from course_manager.cache import clear_entitlements
 from course_manager.models import CourseEnrollment
+from notification_manager.digest import queue_notification
+from notification_manager.models import NotificationTemplate, Notification
+from sTest.authentication import bump_user_version
 from sTest.celery import app
+from sTest.maintenance import MaintenanceJob
 from test_manager.models import TestSubmission
+from user_manager.models import User
+from user_manager.utils import generate_secure_password, send_password_reset_link
+
+
+class SubscriptionExpiryJob(MaintenanceJob):
+    name = 'subscription_expiry'
+    model = CourseEnrollment
+    returning = ['id', 'student_id']
+
+    def get_queryset(self):
+        return CourseEnrollment.objects.filter(subscription_type=CourseEnrollment.PAID,
+                                               subscription_end_date__lt=timezone.now())
+
+    def get_updates(self):
+        return {'subscription_type': CourseEnrollment.FREE}
+
+    def on_changed(self, rows):
+        # Same invalidation as the CourseEnrollment post_save signals
+        for student_id in {row['student_id'] for row in rows}:
+            bump_user_version(student_id)
+            clear_entitlements(student_id)
+
+
+class SubmissionExpiryJob(MaintenanceJob):
+    name = 'submission_expiry'
+    model = TestSubmission
+
+    def get_queryset(self):
+        return TestSubmission.objects.filter(expiration_date__lt=timezone.now(),
+                                             status__in=[TestSubmission.YET_TO_START, TestSubmission.IN_PROGRESS])
+
+    def get_updates(self):
+        return {'status': TestSubmission.EXPIRED}
 
 
 @app.task
 def check_and_update_subscriptions():
-    enrollments = CourseEnrollment.objects.filter(subscription_type=CourseEnrollment.PAID,
-                                                  subscription_end_date__lt=timezone.now())
-    for enrollment in enrollments:
-        enrollment.subscription_type = CourseEnrollment.FREE
-        enrollment.save()
+    SubscriptionExpiryJob().run()
 
 
 @app.task
 def update_expired_test_submissions():
-    now = timezone.now()
-    expired_submissions = TestSubmission.objects.filter(
-        expiration_date__lt=now,
-        status__in=[TestSubmission.YET_TO_START, TestSubmission.IN_PROGRESS]
-    )
-
-    for submission in expired_submissions:
-        submission.status = TestSubmission.EXPIRED
-        submission.save()
+    SubmissionExpiryJob().run()
+
+
+@app.task
+def complete_user_onboarding(user_ids):
+    """
+    Sets the initial password of imported users and sends their reset links. Hashing is the slow part of
+    onboarding, so the importer leaves it to these tasks, spread over the workers in small chunks.
+    """
+    users = list(User.objects.filter(id__in=user_ids))
+    for user in users:
+        user.set_password(generate_secure_password())
+    User.objects.bulk_update(users, ['password'])
+
+    for user in users:
+        send_password_reset_link(user)
+
+
+@app.task
+def send_welcome_notifications(user_ids):
+    """
+    Welcomes the students of a batch approval, loading all of them with one query.
+    """
+    for user_id, name in User.objects.filter(id__in=user_ids).values_list('id', 'name'):
+        queue_notification(notification_name=Notification.REGISTRATION_NOTIFICATION,
+                           params={NotificationTemplate.USER_NAME: name},
+                           user_id=user_id)
@@ -0,0 +1,200 @@
+import logging
+
+from django.db import IntegrityError, transaction
+
+from course_manager.models import Course, CourseEnrollment
+from .models import User, Role, TempUser, StudentMetadata
+from .student_import import build_onboarding_user, schedule_user_onboarding
+from .tasks import send_welcome_notifications
+
+logger = logging.getLogger('Temp-User-Approval')
+
+PARENT_TYPES = ['father', 'mother']
+
+
+class TempUserApproval:
+    """
+    Approves a batch of registered temp users. `validate` resolves the temp users, courses, staff and parents
+    of the whole batch with one query each, `run` creates the approved students with their parents, metadata
+    and enrollments in a handful of set-based statements and deletes the temp users. The temp users stay
+    locked until the batch commits, so concurrent approvals cannot create the same student twice.
+    """
+
+    def __init__(self, data):
+        self.data = data
+        self.approvals = []
+        self.errors = []
+        # Parents to create keyed by email, shared by siblings, and the ids of the existing ones
+        self.new_parents = {}
+        self.parent_ids = {}
+        self.course_ids = {}
+        self.approved_count = 0
+
+    def add_error(self, temp_user_id, errors):
+        self.errors.append({'student': temp_user_id, 'errors': errors})
+
+    def validate(self):
+        students = self.data['students']
+        shared_plan = {key: self.data.get(key) for key in ['courses', 'faculty', 'mentor']}
+
+        temp_users = TempUser.get_all().in_bulk([student['student'] for student in students])
+        self.course_ids = dict(Course.get_all().filter(name__in={
+            course['course'] for student in students for course in student.get('courses', shared_plan['courses'])
+        }).values_list('name', 'id'))
+
+        staff_ids = {student.get(role_name, shared_plan[role_name])
+                     for student in students for role_name in ['faculty', 'mentor']} - {None}
+        staff_roles = dict(User.objects.filter(id__in=staff_ids, is_active=True).values_list('id', 'role__name'))
+
+        parent_ids = {student[f'{parent_type}_id'] for student in students for parent_type in PARENT_TYPES
+                      if f'{parent_type}_id' in student}
+        existing_parent_ids = set(User.filter_users_using_id_and_role(
+            user_ids=parent_ids, role=Role.get_role_using_name('parent')).values_list('id', flat=True))
+
+        emails = {temp_user.email for temp_user in temp_users.values()} | {
+            student[f'{parent_type}_email'].lower() for student in students for parent_type in PARENT_TYPES
+            if f'{parent_type}_email' in student}
+        phone_numbers = {temp_user.phone_number for temp_user in temp_users.values()} | {
+            student[f'{parent_type}_phone_number'] for student in students for parent_type in PARENT_TYPES
+            if f'{parent_type}_email' in student}
+        existing_users = {email: (user_id, role_name) for email, user_id, role_name in User.objects.filter(
+            email__in=emails).values_list('email', 'id', 'role__name')}
+        existing_phone_numbers = set(User.objects.filter(
+            phone_number__in=phone_numbers).values_list('phone_number', flat=True))
+        student_emails = {temp_user.email for temp_user in temp_users.values()}
+        # Phone numbers that a new parent cannot take
+        taken_phone_numbers = existing_phone_numbers | {temp_user.phone_number for temp_user in temp_users.values()}
+
+        for student in students:
+            temp_user = temp_users.get(student['student'])
+            if temp_user is None:
+                self.add_error(student['student'], ['Invalid student ID.'])
+                continue
+
+            errors = []
+            if temp_user.email in existing_users:
+                errors.append(f'A user with the email {temp_user.email} already exists.')
+            if temp_user.phone_number in existing_phone_numbers:
+                errors.append(f'A user with the phone number {temp_user.phone_number} already exists.')
+
+            courses = student.get('courses', shared_plan['courses'])
+            unknown_courses = [course['course'] for course in courses if course['course'] not in self.course_ids]
+            if unknown_courses:
+                errors.append(f'Unknown courses: {", ".join(unknown_courses)}.')
+
+            staff = {}
+            for role_name in ['faculty', 'mentor']:
+                staff[role_name] = student.get(role_name, shared_plan[role_name])
+                if staff[role_name] is not None and staff_roles.get(staff[role_name]) != role_name:
+                    errors.append(f'Invalid {role_name} ID.')
+
+            parents = {}
+            for parent_type in PARENT_TYPES:
+                label = str.capitalize(parent_type)
+                if f'{parent_type}_id' in student:
+                    parents[parent_type] = ('id', student[f'{parent_type}_id'])
+                    if student[f'{parent_type}_id'] not in existing_parent_ids:
+                        errors.append(f'{label} - invalid parent ID.')
+                elif f'{parent_type}_email' in student:
+                    parent_email = student[f'{parent_type}_email'].lower()
+                    parents[parent_type] = ('email', parent_email)
+                    if parent_email in student_emails:
+                        errors.append(f'{label} - email belongs to a student in the batch.')
+                    elif parent_email in existing_users:
+                        parent_id, role_name = existing_users[parent_email]
+                        if role_name == 'parent':
+                            self.parent_ids[parent_email] = parent_id
+                        else:
+                            errors.append(f'{label} - {parent_email} is not a parent.')
+                    elif parent_email not in self.new_parents:
+                        # A sibling may already have brought this parent
+                        parent_phone_number = student[f'{parent_type}_phone_number']
+                        if parent_phone_number in taken_phone_numbers:
+                            errors.append(f'{label} - the phone number {parent_phone_number} is already taken.')
+                        else:
+                            taken_phone_numbers.add(parent_phone_number)
+                            self.new_parents[parent_email] = {'name': student[f'{parent_type}_name'],
+                                                              'phone_number': parent_phone_number}
+
+            if errors:
+                self.add_error(temp_user.id, errors)
+                continue
+
+            self.approvals.append({'temp_user': temp_user, 'courses': courses, 'faculty_id': staff['faculty'],
+                                   'mentor_id': staff['mentor'], 'parents': parents})
+
+    def run(self):
+        if not self.approvals:
+            return
+
+        try:
+            with transaction.atomic():
+                self.create_students()
+        except IntegrityError as e:
+            # Someone took an email or phone number of the batch since it was validated
+            logger.warning(f'Error approving temp users because of {e}')
+            for approval in self.approvals:
+                self.add_error(approval['temp_user'].id, ['An email or phone number of the batch is already taken.'])
+            self.approved_count = 0
+
+    def create_students(self):
+        temp_users = TempUser.get_all().select_for_update().in_bulk(
+            [approval['temp_user'].id for approval in self.approvals])
+        approvals = []
+        for approval in self.approvals:
+            if approval['temp_user'].id in temp_users:
+                approvals.append({**approval, 'temp_user': temp_users[approval['temp_user'].id]})
+            else:
+                # A concurrent approval got there first
+                self.add_error(approval['temp_user'].id, ['Invalid student ID.'])
+        self.approvals = approvals
+        if not self.approvals:
+            return
+
+        parent_emails = list(dict.fromkeys(
+            value for approval in self.approvals for kind, value in approval['parents'].values()
+            if kind == 'email' and value not in self.parent_ids))
+        parents = User.objects.bulk_create([
+            build_onboarding_user(email=parent_email, role=Role.get_role_using_name('parent'),
+                                  **self.new_parents[parent_email])
+            for parent_email in parent_emails
+        ])
+        self.parent_ids.update({parent.email: parent.id for parent in parents})
+
+        # The temp user's password is already hashed, so the student keeps the one chosen at registration
+        students = User.objects.bulk_create([
+            User(email=approval['temp_user'].email, phone_number=approval['temp_user'].phone_number,
+                 name=approval['temp_user'].name, password=approval['temp_user'].password,
+                 role=Role.get_role_using_name('student'))
+            for approval in self.approvals
+        ])
+
+        StudentMetadata.objects.bulk_create([
+            StudentMetadata(student=student, faculty_id=approval['faculty_id'], mentor_id=approval['mentor_id'],
+                            **{f'{parent_type}_id': value if kind == 'id' else self.parent_ids[value]
+                               for parent_type, (kind, value) in approval['parents'].items()})
+            for student, approval in zip(students, self.approvals)
+        ])
+        CourseEnrollment.objects.bulk_create([
+            CourseEnrollment(student=student, course_id=self.course_ids[course['course']],
+                             subscription_start_date=course['subscription_start_date'],
+                             subscription_end_date=course['subscription_end_date'],
+                             subscription_type=course['subscription_type'])
+            for student, approval in zip(students, self.approvals)
+            for course in approval['courses']
+        ])
+
+        TempUser.objects.filter(id__in=[approval['temp_user'].id for approval in self.approvals]).delete()
+
+        parent_ids = [parent.id for parent in parents]
+        student_ids = [student.id for student in students]
+        transaction.on_commit(lambda: schedule_user_onboarding(parent_ids))
+        transaction.on_commit(lambda: send_welcome_notifications.delay(user_ids=student_ids))
+        self.approved_count = len(students)
+
+    def get_report(self):
+        return {
+            'approved_count': self.approved_count,
+            'failed_count': len(self.errors),
+            'errors': self.errors,
+        }
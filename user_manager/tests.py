@@ -1,3 +1,226 @@
-from django.test import TestCase
+from datetime import timedelta
+from unittest import mock
 
-# Create your tests here.
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.test import TestCase, TransactionTestCase, override_settings
+from django.utils import timezone
+from rest_framework.request import Request
+from rest_framework.test import APIRequestFactory, force_authenticate
+
+from course_manager.cache import bump_catalog_version
+from course_manager.models import Course, CourseEnrollment
+from sTest.authentication import CachedSessionAuthentication
+from sTest.maintenance import get_last_maintenance_run
+from test_manager.models import Test, TestSubmission
+from user_manager.models import Role, User, StudentMetadata, TempUser
+from user_manager.student_import import StudentImport, read_student_import_file
+from user_manager.temp_user_approval import TempUserApproval
+from user_manager.utils import get_user_validators
+from user_manager.views import UserViewSet
+from user_manager.tasks import SubmissionExpiryJob
+
+LOCMEM_CACHES = {'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}}
+
+
+def create_user(role, index, **kwargs):
+    return User.objects.create(email=f'{role.name}{index}@example.com', phone_number=f'9{index:09d}',
+                               name=f'{role.name} {index}', role=role, **kwargs)
+
+
+@override_settings(CACHES=LOCMEM_CACHES)
+class CachedSessionAuthenticationTests(TestCase):
+    def setUp(self):
+        # The admin role is created first so that a wrong role_id would point at it
+        self.admin_role = Role.objects.create(name='admin', description='Admin')
+        self.student_role = Role.objects.create(name='student', description='Student')
+        self.student = create_user(self.student_role, 1, change_password=False)
+
+    def authenticate(self):
+        request = APIRequestFactory().get('/api/user/session_validate/')
+        request.session = self.client.session
+        return CachedSessionAuthentication().authenticate(Request(request))
+
+    def test_user_served_from_cached_context_keeps_its_fields(self):
+        self.client.force_login(self.student)
+        # The first request loads the user and caches its auth context
+        self.authenticate()
+        Role.get_role_table()
+
+        with self.assertNumQueries(0):
+            user, _ = self.authenticate()
+
+        self.assertEqual(user.id, self.student.id)
+        self.assertEqual(user.role_id, self.student_role.id)
+        self.assertEqual(user.role.name, 'student')
+        self.assertIs(user.is_active, True)
+        self.assertIs(user.change_password, False)
+        self.assertEqual(user.email, self.student.email)
+        self.assertIn('password', user.get_deferred_fields())
+
+
+# Not a TestCase, the job has to open its own transactions as it does in the beat task
+@override_settings(CACHES=LOCMEM_CACHES)
+class SubmissionExpiryJobTests(TransactionTestCase):
+    def setUp(self):
+        admin = create_user(Role.objects.create(name='admin', description='Admin'), 1)
+        student_role = Role.objects.create(name='student', description='Student')
+        self.test = Test.objects.create(course=Course.objects.create(name='JEE'), name='Test', created_by=admin,
+                                        updated_by=admin)
+        self.students = [create_user(student_role, index) for index in range(2, 7)]
+
+    def create_submissions(self, students, expiration_date, status=TestSubmission.YET_TO_START):
+        return TestSubmission.objects.bulk_create([
+            TestSubmission(test=self.test, student=student, status=status, assigned_date=timezone.now(),
+                           expiration_date=expiration_date)
+            for student in students
+        ])
+
+    def test_job_expires_overdue_submissions_in_chunks(self):
+        overdue = self.create_submissions(self.students[:3], timezone.now() - timedelta(hours=1))
+        overdue += self.create_submissions(self.students[3:4], timezone.now() - timedelta(hours=1),
+                                           status=TestSubmission.IN_PROGRESS)
+        completed = self.create_submissions(self.students[4:], timezone.now() - timedelta(hours=1),
+                                            status=TestSubmission.COMPLETED)
+        upcoming = self.create_submissions(self.students[:1], timezone.now() + timedelta(hours=1))
+
+        job = SubmissionExpiryJob()
+        job.chunk_size = 3
+        run = job.run()
+
+        self.assertEqual(run['changed_count'], len(overdue))
+        self.assertEqual(run['chunk_count'], 2)
+        self.assertEqual(get_last_maintenance_run(job.name)['changed_count'], len(overdue))
+        statuses = dict(TestSubmission.objects.values_list('id', 'status'))
+        self.assertEqual({statuses[submission.id] for submission in overdue}, {TestSubmission.EXPIRED})
+        self.assertEqual(statuses[completed[0].id], TestSubmission.COMPLETED)
+        self.assertEqual(statuses[upcoming[0].id], TestSubmission.YET_TO_START)
+
+
+@override_settings(CACHES=LOCMEM_CACHES)
+class StudentImportTests(TestCase):
+    def setUp(self):
+        for role_name in ['student', 'parent', 'faculty']:
+            Role.objects.create(name=role_name, description=role_name.capitalize())
+        self.faculty = create_user(Role.objects.get(name='faculty'), 1)
+        self.course = Course.objects.create(name='JEE')
+
+    def import_students(self, rows):
+        content = 'name,email,phone_number,courses,faculty_email,father_name,father_email,father_phone_number\n'
+        content += ''.join(f'{",".join(row)}\n' for row in rows)
+        student_import = StudentImport(read_student_import_file(SimpleUploadedFile('students.csv', content.encode())))
+        student_import.validate()
+        student_import.run()
+        return student_import.get_report()
+
+    def test_valid_rows_are_created_and_invalid_rows_reported(self):
+        report = self.import_students([
+            ['Asha', 'ASHA@example.com', '9000000002', 'JEE', self.faculty.email, 'Ravi', 'ravi@example.com',
+             '9000000003'],
+            # A sibling shares the father
+            ['Arun', 'arun@example.com', '9000000004', 'JEE', '', 'Ravi', 'ravi@example.com', '9000000003'],
+            ['Meera', 'meera@example.com', '9000000005', 'NEET', '', '', '', ''],
+            ['Kiran', 'not-an-email', '9000000006', 'JEE', '', '', '', ''],
+        ])
+
+        self.assertEqual(report['created_count'], 2)
+        self.assertEqual([error['row'] for error in report['errors']], [4, 5])
+        self.assertEqual(report['errors'][0]['errors'], ['Unknown courses: NEET.'])
+
+        father = User.objects.get(email='ravi@example.com')
+        self.assertEqual(father.role.name, 'parent')
+        self.assertFalse(father.has_usable_password())
+        metadata = StudentMetadata.objects.get(student__email='asha@example.com')
+        self.assertEqual((metadata.father_id, metadata.faculty_id), (father.id, self.faculty.id))
+        self.assertEqual(StudentMetadata.objects.get(student__email='arun@example.com').father_id, father.id)
+        self.assertEqual(CourseEnrollment.objects.filter(course=self.course, subscription_type=CourseEnrollment.FREE)
+                         .count(), 2)
+
+    def test_existing_users_are_not_imported_again(self):
+        User.objects.create(email='asha@example.com', phone_number='9000000002', name='Asha',
+                            role=Role.objects.get(name='student'))
+
+        report = self.import_students([['Asha', 'asha@example.com', '9000000007', 'JEE', '', '', '', '']])
+
+        self.assertEqual(report['created_count'], 0)
+        self.assertEqual(report['errors'][0]['errors'], ['A user with the email asha@example.com already exists.'])
+
+
+@override_settings(CACHES=LOCMEM_CACHES)
+class TempUserApprovalTests(TestCase):
+    def setUp(self):
+        for role_name in ['student', 'parent']:
+            Role.objects.create(name=role_name, description=role_name.capitalize())
+        Course.objects.create(name='JEE')
+        self.temp_users = [
+            TempUser.objects.create(email=f'temp{index}@example.com', phone_number=f'8{index:09d}',
+                                    name=f'Temp {index}', is_active=True)
+            for index in range(1, 3)
+        ]
+
+    def validate(self):
+        approval = TempUserApproval({
+            'students': [{'student': temp_user.id} for temp_user in self.temp_users],
+            'courses': [{'course': 'JEE', 'subscription_start_date': timezone.now().date(),
+                         'subscription_end_date': timezone.now().date() + timedelta(days=120),
+                         'subscription_type': CourseEnrollment.FREE}],
+        })
+        approval.validate()
+        return approval
+
+    def test_temp_user_approved_in_the_meantime_is_reported(self):
+        approval = self.validate()
+        # A concurrent approval committed between this batch's validation and its run
+        TempUser.objects.filter(id=self.temp_users[0].id).delete()
+
+        approval.run()
+
+        report = approval.get_report()
+        self.assertEqual(report['approved_count'], 1)
+        self.assertEqual(report['errors'], [{'student': self.temp_users[0].id, 'errors': ['Invalid student ID.']}])
+        self.assertTrue(User.objects.filter(email='temp2@example.com').exists())
+        self.assertFalse(TempUser.objects.exists())
+
+    def test_taken_phone_number_fails_the_batch_per_student(self):
+        approval = self.validate()
+        User.objects.create(email='other@example.com', phone_number=self.temp_users[1].phone_number, name='Other',
+                            role=Role.objects.get(name='student'))
+
+        approval.run()
+
+        report = approval.get_report()
+        self.assertEqual(report['approved_count'], 0)
+        self.assertEqual([error['student'] for error in report['errors']],
+                         [temp_user.id for temp_user in self.temp_users])
+        self.assertFalse(User.objects.filter(email__startswith='temp').exists())
+        self.assertEqual(TempUser.objects.count(), 2)
+
+
+@override_settings(CACHES=LOCMEM_CACHES)
+class UserValidatorsTests(TestCase):
+    def test_etag_changes_with_the_course_catalog(self):
+        student = create_user(Role.objects.create(name='student', description='Student'), 1)
+        request = APIRequestFactory().get(f'/api/user/{student.id}/')
+        request.user = student
+
+        etag, _ = get_user_validators(None, request, pk=student.id)
+        self.assertEqual(get_user_validators(None, request, pk=student.id)[0], etag)
+
+        # A course rename bumps the catalog version but not the user version
+        bump_catalog_version()
+
+        self.assertNotEqual(get_user_validators(None, request, pk=student.id)[0], etag)
+
+
+@override_settings(CACHES=LOCMEM_CACHES)
+class UnreadNotificationCountTests(TestCase):
+    @mock.patch('user_manager.views.get_unread_count', return_value=4)
+    def test_badge_reads_the_unread_counter_of_the_user(self, get_unread_count):
+        student = create_user(Role.objects.create(name='student', description='Student'), 1)
+        request = APIRequestFactory().get('/api/user/unread-notification-count/')
+        force_authenticate(request, user=student)
+
+        with self.assertNumQueries(0):
+            response = UserViewSet.as_view({'get': 'unread_notification_count'})(request)
+
+        self.assertEqual(response.data, {'unread_count': 4})
+        get_unread_count.assert_called_once_with(student.id)
@@ -3,8 +3,10 @@ from datetime import timedelta
 from django.conf import settings
 from django.utils import timezone
 
+from course_manager.cache import get_catalog_version
 from notification_manager.models import NotificationTemplate, Notification
 from notification_manager.utils import send_notification
+from sTest.authentication import get_user_version
 from user_manager.models import PasswordResetToken
 
 
@@ -44,3 +46,10 @@ def generate_secure_password():
     #         return password
     #     except ValidationError:
     #         continue
+
+
+def get_user_validators(view, request, pk=None, *args, **kwargs):
+    # Same rule as UserViewSet.retrieve, only the admin may look up other users
+    user_id = pk if request.user.role.name == 'admin' else request.user.id
+    # The payload embeds course and subject data, which changes without bumping the user version
+    return f'{user_id}-{get_user_version(user_id)}-{get_catalog_version()}', None
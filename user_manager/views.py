@@ -18,16 +18,23 @@ from rest_framework.permissions import IsAuthenticated
 from rest_framework.response import Response
 
 from course_manager.models import Course, CourseEnrollment
+from notification_manager.digest import queue_notification
 from notification_manager.models import Notification, NotificationTemplate
-from notification_manager.utils import send_notification
+from notification_manager.read_state import get_unread_count
+from sTest.conditional import conditional_response
 from sTest.permissions import IsAdmin, ChangePasswordPermission, IsAdminOrMentorOrFaculty
-from sTest.utils import get_error_response_for_serializer, CustomPageNumberPagination, get_error_response
+from sTest.throttling import AuthRateThrottle
+from sTest.utils import get_error_response_for_serializer, CustomPageNumberPagination, get_error_response, \
+    get_paginator
 from .filters import UserFilter
 from .models import Role, User, TempUser, StudentMetadata, PasswordResetToken
+from .search import search_users, TYPEAHEAD_DEFAULT_LIMIT, TYPEAHEAD_MAX_LIMIT
 from .serializers import UserSerializer, TempUserSerializer, UserCreationSerializer, \
     ApproveStudentSubscriptionSerializer, ChangePasswordSerializer, LoginSerializer, RoleSerializer, \
-    UserUpdateSerializer, StudentUpdateSerializer
-from .utils import generate_secure_password, send_password_reset_link
+    UserUpdateSerializer, StudentUpdateSerializer, UserDetailSerializer, BatchApproveTempUsersSerializer
+from .student_import import StudentImport, read_student_import_file
+from .temp_user_approval import TempUserApproval
+from .utils import generate_secure_password, send_password_reset_link, get_user_validators
 
 
 class UserViewSet(viewsets.ModelViewSet):
@@ -89,6 +96,7 @@ class UserViewSet(viewsets.ModelViewSet):
     def session_validate(self, request):
         """
             Custom action to check if the user's session is still valid.
+            The user and role come from the cached auth context, so this does not hit the database.
         """
         # If the request reaches this point, the user is authenticated
         user = request.user
@@ -97,7 +105,7 @@ class UserViewSet(viewsets.ModelViewSet):
         return Response(data=response, status=status.HTTP_200_OK)
 
 
-    @action(detail=False, methods=['POST'], permission_classes=[AllowAny])
+    @action(detail=False, methods=['POST'], permission_classes=[AllowAny], throttle_classes=[AuthRateThrottle])
     def login(self, request):
         email = request.data.get('email')
         password = request.data.get('password')
@@ -115,6 +123,12 @@ class UserViewSet(viewsets.ModelViewSet):
             }
             return Response(data=response, status=status.HTTP_401_UNAUTHORIZED)
 
+    @action(detail=False, methods=['GET'], permission_classes=[IsAuthenticated],
+            url_path='unread-notification-count')
+    def unread_notification_count(self, request):
+        # Read from the Redis counter, the notification badge is polled on every page
+        return Response({'unread_count': get_unread_count(request.user.id)}, status=status.HTTP_200_OK)
+
     @action(detail=False, methods=['POST'], permission_classes=[IsAuthenticated])
     def logout(self, request):
         logout(request)
@@ -128,23 +142,7 @@ class UserViewSet(viewsets.ModelViewSet):
 
     @permission_classes([IsAdminOrMentorOrFaculty])
     def list(self, request):
-        user = request.user
-        if user.role.name == 'faculty':
-            sm = StudentMetadata.objects.filter(faculty=user)
-            users = User.filter_users_using_id_and_role(user_ids=sm.values_list('student', flat=True),
-                                                        role=Role.get_role_using_name('student').id)
-        elif user.role.name == 'mentor':
-            sm = StudentMetadata.objects.filter(mentor=user)
-            users = User.filter_users_using_id_and_role(user_ids=sm.values_list('student', flat=True),
-                                                        role=Role.get_role_using_name('student').id)
-        elif user.role.name == 'admin':
-            role = request.query_params.get('role', None)
-            if role:
-                users = User.filter_users_by_role(role_id=role)
-            else:
-                users = User.filter_users_excluding_role(role_id=Role.get_role_using_name('admin').id)
-        else:
-            users = []
+        users = self._get_visible_users(request)
 
         # Apply dynamic filtering
         filter_backends = [DjangoFilterBackend]
@@ -152,11 +150,10 @@ class UserViewSet(viewsets.ModelViewSet):
         if not filterset.is_valid():
             return get_error_response('Invalid filter parameters')
 
-        filtered_users = filterset.qs
+        filtered_users = UserSerializer.setup_eager_loading(filterset.qs)
 
         # Apply pagination
-        paginator = CustomPageNumberPagination()
-        paginator.page_size = 15
+        paginator = get_paginator(request, ordering='-id')
         paginated_users = paginator.paginate_queryset(filtered_users, request)
 
         serializer = UserSerializer(paginated_users, many=True)
@@ -164,7 +161,24 @@ class UserViewSet(viewsets.ModelViewSet):
         # Return the paginated response
         return paginator.get_paginated_response(serializer.data)
 
+    @action(detail=False, methods=['GET'], permission_classes=[IsAdminOrMentorOrFaculty], url_path='typeahead')
+    def typeahead(self, request):
+        query = request.query_params.get('q', '').strip()
+        if not query:
+            return Response(data=[], status=status.HTTP_200_OK)
+
+        try:
+            limit = max(1, min(int(request.query_params.get('limit', TYPEAHEAD_DEFAULT_LIMIT)), TYPEAHEAD_MAX_LIMIT))
+        except ValueError:
+            return get_error_response('Invalid limit')
+
+        users = search_users(self._get_visible_users(request), query).select_related('role')[:limit]
+
+        serializer = UserDetailSerializer(users, many=True)
+        return Response(data=serializer.data, status=status.HTTP_200_OK)
+
     @permission_classes([IsAuthenticated])
+    @conditional_response(get_user_validators)
     def retrieve(self, request, pk=None):
         user = request.user
         if user.role.name == 'admin':
@@ -195,6 +209,40 @@ class UserViewSet(viewsets.ModelViewSet):
         except Exception as e:
             return get_error_response_for_serializer(logger=self.logger, serializer=serializer, data=request.data)
 
+    @action(detail=False, methods=['POST'], permission_classes=[IsAdmin], url_path='approve-temp-users')
+    def approve_temp_users(self, request):
+        serializer = BatchApproveTempUsersSerializer(data=request.data)
+        try:
+            serializer.is_valid(raise_exception=True)
+
+            approval = TempUserApproval(serializer.validated_data)
+            approval.validate()
+            approval.run()
+            return Response(data=approval.get_report(), status=status.HTTP_200_OK)
+        except Exception as e:
+            return get_error_response_for_serializer(logger=self.logger, serializer=serializer, data=request.data)
+
+    @action(detail=False, methods=['POST'], permission_classes=[IsAdmin], url_path='import-students')
+    def import_students(self, request):
+        file = request.FILES.get('file')
+        if file is None:
+            return get_error_response('A CSV or XLSX file is required.')
+
+        try:
+            students = read_student_import_file(file)
+        except Exception as e:
+            self.logger.exception(f'Error reading student import file {file.name}')
+            return get_error_response(str(e))
+
+        try:
+            student_import = StudentImport(students)
+            student_import.validate()
+            student_import.run()
+            return Response(data=student_import.get_report(), status=status.HTTP_200_OK)
+        except Exception as e:
+            self.logger.exception(f'Error importing students from {file.name}')
+            return get_error_response(str(e))
+
     @action(detail=False, methods=['POST'], permission_classes=[ChangePasswordPermission])
     def change_password(self, request, pk=None):
         user = request.user
@@ -233,13 +281,12 @@ class UserViewSet(viewsets.ModelViewSet):
         )
 
         # Distinctly select students
-        qualified_students = User.objects.filter(
+        qualified_students = UserSerializer.setup_eager_loading(User.objects.filter(
             id__in=qualified_enrollments.values_list('student', flat=True)
-        ).distinct()
+        ).distinct())
 
         # Apply pagination
-        paginator = CustomPageNumberPagination()
-        paginator.page_size = 15
+        paginator = get_paginator(request, ordering='-id')
         paginated_users = paginator.paginate_queryset(qualified_students, request)
 
         serializer = UserSerializer(paginated_users, many=True)
@@ -247,7 +294,7 @@ class UserViewSet(viewsets.ModelViewSet):
         # Return the paginated response
         return paginator.get_paginated_response(serializer.data)
 
-    @action(detail=False, methods=['POST'], permission_classes=[AllowAny])
+    @action(detail=False, methods=['POST'], permission_classes=[AllowAny], throttle_classes=[AuthRateThrottle])
     def forgot_password(self, request):
         email = request.data.get('email')
         try:
@@ -273,13 +320,13 @@ class UserViewSet(viewsets.ModelViewSet):
         # Send notification
         notification_params = {NotificationTemplate.RESET_LINK: reset_link}
 
-        send_notification.delay(notification_name=Notification.FORGOT_PASSWORD_NOTIFICATION,
-                                params=notification_params,
-                                user_id=user.id)
+        queue_notification(notification_name=Notification.FORGOT_PASSWORD_NOTIFICATION,
+                           params=notification_params,
+                           user_id=user.id)
 
         return Response({"detail": "Password reset email sent."}, status=status.HTTP_200_OK)
 
-    @action(detail=False, methods=['POST'], permission_classes=[AllowAny])
+    @action(detail=False, methods=['POST'], permission_classes=[AllowAny], throttle_classes=[AuthRateThrottle])
     def reset_password(self, request):
         token = request.data.get('token')
         password = request.data.get('password')
@@ -302,6 +349,27 @@ class UserViewSet(viewsets.ModelViewSet):
 
         return Response(status=status.HTTP_200_OK)
 
+    def _get_visible_users(self, request):
+        # Faculty and mentors only see their own students, admins see everyone but other admins
+        user = request.user
+        if user.role.name == 'faculty':
+            sm = StudentMetadata.objects.filter(faculty=user)
+            users = User.filter_users_using_id_and_role(user_ids=sm.values_list('student', flat=True),
+                                                        role=Role.get_role_using_name('student').id)
+        elif user.role.name == 'mentor':
+            sm = StudentMetadata.objects.filter(mentor=user)
+            users = User.filter_users_using_id_and_role(user_ids=sm.values_list('student', flat=True),
+                                                        role=Role.get_role_using_name('student').id)
+        elif user.role.name == 'admin':
+            role = request.query_params.get('role', None)
+            if role:
+                users = User.filter_users_by_role(role_id=role)
+            else:
+                users = User.filter_users_excluding_role(role_id=Role.get_role_using_name('admin').id)
+        else:
+            users = User.objects.none()
+        return users
+
     @transaction.atomic
     def _process_temp_user(self, data):
         temp_user_data = TempUser.get_temp_user_using_id(data['student'])
@@ -489,7 +557,8 @@ class TempUserViewSet(viewsets.ModelViewSet):
     serializer_class = TempUserSerializer
     logger = logging.getLogger('Temp User')
 
-    @action(detail=False, methods=['POST'], permission_classes=[AllowAny], url_path='register')
+    @action(detail=False, methods=['POST'], permission_classes=[AllowAny], throttle_classes=[AuthRateThrottle],
+            url_path='register')
     def register(self, request):
         serializer = TempUserSerializer(data=request.data)
         try:
@@ -510,16 +579,17 @@ class TempUserViewSet(viewsets.ModelViewSet):
             # Send notification
             notification_params = {NotificationTemplate.USER_NAME: request.data.get("name"),
                                    NotificationTemplate.OTP: str(otp)}
-            send_notification.delay(notification_name=Notification.REGISTRATION_OTP_NOTIFICATION,
-                                    params=notification_params,
-                                    user_id=user_instance.id)
+            queue_notification(notification_name=Notification.REGISTRATION_OTP_NOTIFICATION,
+                               params=notification_params,
+                               user_id=user_instance.id)
 
             return Response({"message": "OTP sent to email. Please verify to complete registration."},
                             status=status.HTTP_200_OK)
         except Exception as e:
             return get_error_response_for_serializer(logger=self.logger, serializer=serializer, data=request.data)
 
-    @action(detail=False, methods=['POST'], permission_classes=[AllowAny], url_path='verify-otp')
+    @action(detail=False, methods=['POST'], permission_classes=[AllowAny], throttle_classes=[AuthRateThrottle],
+            url_path='verify-otp')
     def verify_otp(self, request):
         email = request.data.get('email')
         user_otp = request.data.get('otp')
@@ -539,9 +609,9 @@ class TempUserViewSet(viewsets.ModelViewSet):
 
             notification_params = {NotificationTemplate.USER_NAME: temp_user.name}
 
-            send_notification.delay(notification_name=Notification.REGISTRATION_NOTIFICATION,
-                                    params=notification_params,
-                                    user_id=temp_user.id)
+            queue_notification(notification_name=Notification.REGISTRATION_NOTIFICATION,
+                               params=notification_params,
+                               user_id=temp_user.id)
 
             return Response({"message": "User registered successfully"}, status=status.HTTP_201_CREATED)
         else: